@@ -0,0 +1,68 @@
+"""
+Память, занимаемая элементами текста большой книги: словари против BookElement.
+
+Запуск из каталога lab8:
+    python benchmarks/bench_elements.py --sections 2000
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import tracemalloc
+
+from lxml import etree
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "with_pattern"))
+sys.path.insert(0, os.path.dirname(__file__))
+
+from synthetic import generate_fb2  # noqa: E402
+from parsers import BookElement  # noqa: E402
+from utils import FB2_NS  # noqa: E402
+
+FB = "{%s}" % FB2_NS["fb"]
+
+
+def collect(path, make):
+    """Построить все элементы книги и вернуть (количество, байт без HTML)"""
+    parser = etree.XMLParser(recover=True, remove_blank_text=True, huge_tree=True)
+    root = etree.parse(path, parser).getroot()
+    nodes = [
+        node
+        for node in root.iter(FB + "p", FB + "title", FB + "subtitle")
+        if node.getparent().tag != FB + "title"
+    ]
+    html = [etree.tostring(node, encoding="unicode") for node in nodes]
+
+    tracemalloc.start()
+    elements = [
+        # Имя тега как в рендере: новая строка на каждый элемент
+        make(etree.QName(node.tag).localname, markup, len(markup))
+        for node, markup in zip(nodes, html)
+    ]
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return len(elements), size
+
+
+def as_dict(element_type, html, text_len):
+    return {"type": element_type, "html": html, "text_len": text_len}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sections", type=int, default=2000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "book.fb2")
+        megabytes = generate_fb2(path, sections=args.sections, images=0) / 1_000_000
+        count, dict_size = collect(path, as_dict)
+        _, slots_size = collect(path, BookElement)
+
+    print(f"{megabytes:.1f} MB, {count} элементов")
+    for name, size in (("dict", dict_size), ("BookElement", slots_size)):
+        print(
+            f"{name:>12}: {size / 1_000_000:6.1f} MB ({size / count:.0f} байт на элемент)"
+        )
+    print(f"экономия: {(dict_size - slots_size) / 1_000_000:.1f} MB")
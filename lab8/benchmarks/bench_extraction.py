@@ -0,0 +1,61 @@
+"""
+Замер извлечения элементов FB2ContentIterator на больших книгах.
+
+Запуск из каталога lab8:
+    python benchmarks/bench_extraction.py --sections 2000
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+from lxml import etree
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "with_pattern"))
+sys.path.insert(0, os.path.dirname(__file__))
+
+from synthetic import generate_fb2  # noqa: E402
+from parsers.fb2 import FB2ContentIterator  # noqa: E402
+from utils import FB2_NS  # noqa: E402
+
+
+def bench(path, repeat):
+    parser = etree.XMLParser(recover=True, remove_blank_text=True, huge_tree=True)
+    root = etree.parse(path, parser).getroot()
+
+    best = None
+    count = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        count = sum(1 for _ in FB2ContentIterator(root, FB2_NS))
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, count
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sections", type=int, default=1000)
+    parser.add_argument("--paragraphs", type=int, default=30)
+    parser.add_argument("--nesting", type=int, default=2)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "book.fb2")
+        size = generate_fb2(
+            path,
+            sections=args.sections,
+            paragraphs=args.paragraphs,
+            nesting=args.nesting,
+            images=0,
+        )
+        elapsed, count = bench(path, args.repeat)
+
+    megabytes = size / 1_000_000
+    print(
+        f"{megabytes:.1f} MB, {count} элементов: {elapsed:.3f} с "
+        f"({megabytes / elapsed:.1f} MB/s, {count / elapsed:,.0f} элементов/с)"
+    )
@@ -0,0 +1,295 @@
+"""
+Сквозной замер конвейера FB2: with_pattern против without_pattern.
+
+На синтетических книгах замеряются разбор (FB2Formatter.parse или
+конструктор Book), постраничный обход книги, загрузка библиотеки
+(Library.load_library) и поиск (search_books). Для каждого этапа
+печатаются время, пропускная способность (MB/s, страниц/с) и пиковая
+память процесса. Каждый замер идёт в отдельном процессе: варианты
+используют одни и те же имена пакетов, а пиковая память должна
+относиться к одному этапу.
+
+Запуск из каталога lab8:
+    python benchmarks/bench_pipeline.py --sections 2000 --images 5
+    python benchmarks/bench_pipeline.py --json baseline.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+from synthetic import generate_fb2
+
+LAB_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+VARIANTS = ("with_pattern", "without_pattern")
+TASKS = ("parse", "pages", "library", "search")
+SEARCH_QUERIES = ("книга 7", "синтетический", "нет такой книги")
+SEARCH_ROUNDS = 200
+
+
+def peak_rss_mb():
+    """
+    Пиковый RSS процесса в мегабайтах.
+
+    В Linux берётся VmHWM: ru_maxrss сохраняется при exec, и дочерний
+    процесс унаследовал бы пик родителя, сгенерировавшего книгу.
+    """
+    try:
+        with open("/proc/self/status", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    # ru_maxrss в килобайтах (Linux) или байтах (macOS)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+def setup_parse(variant, args):
+    if variant == "with_pattern":
+        from parsers.fb2 import FB2Formatter
+
+        def run():
+            result = FB2Formatter().parse(args.book)
+            return {"pages": result["total_pages"]}
+
+    else:
+        from models import Book
+
+        def run():
+            return {"pages": Book(args.book).total_pages}
+
+    return run
+
+
+def setup_pages(variant, args):
+    """Открытие книги и переход по всем страницам подряд"""
+    if variant == "with_pattern":
+        from models import Book
+        from parsers.fb2 import FB2Formatter
+
+        def open_book():
+            return Book(args.book, FB2Formatter())
+
+    else:
+        from models import Book
+
+        def open_book():
+            return Book(args.book)
+
+    def run():
+        book = open_book()
+        pages = 0
+        while book.get_page(pages) is not None:
+            pages += 1
+        return {"pages": pages}
+
+    return run
+
+
+def setup_library(variant, args):
+    from models import Library
+
+    def run():
+        return {"books": len(Library(args.settings_dir).books)}
+
+    return run
+
+
+def setup_search(variant, args):
+    from models import Library
+
+    library = Library(args.settings_dir)
+
+    def run():
+        found = 0
+        for _ in range(SEARCH_ROUNDS):
+            for query in SEARCH_QUERIES:
+                found += len(library.search_books(query))
+        return {"queries": SEARCH_ROUNDS * len(SEARCH_QUERIES), "found": found}
+
+    return run
+
+
+def prepare_library(variant, args):
+    """Наполнение библиотеки варианта книгами из каталога; не замеряется"""
+    from models import Library
+
+    library = Library(args.settings_dir)
+    for name in sorted(os.listdir(args.library_dir)):
+        library.add_book(os.path.join(args.library_dir, name))
+    library.save_library()
+
+
+SETUPS = {
+    "parse": setup_parse,
+    "pages": setup_pages,
+    "library": setup_library,
+    "search": setup_search,
+}
+
+
+def worker(variant, task, args):
+    """Выполнение одного этапа в текущем процессе; результат — JSON в stdout"""
+    sys.path.insert(0, os.path.join(LAB_DIR, variant))
+    if task == "prepare":
+        prepare_library(variant, args)
+        return
+
+    run = SETUPS[task](variant, args)
+    rss_before = peak_rss_mb()
+    best = None
+    result = {}
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        result = run()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    peak = peak_rss_mb()
+    result.update(seconds=best, peak_rss_mb=peak, rss_growth_mb=peak - rss_before)
+    # Код приложения печатает ошибки в stdout, результат — последняя строка
+    print(json.dumps(result))
+
+
+def run_worker(variant, task, args):
+    command = [
+        sys.executable,
+        os.path.abspath(__file__),
+        "--worker",
+        variant,
+        task,
+        "--book",
+        args.book,
+        "--library-dir",
+        args.library_dir,
+        "--settings-dir",
+        os.path.join(args.tmp, f"settings-{variant}"),
+        "--repeat",
+        str(args.repeat),
+    ]
+    completed = subprocess.run(command, capture_output=True, text=True, cwd=args.tmp)
+    if completed.returncode != 0:
+        raise RuntimeError(f"{variant} {task}: {completed.stderr.strip()}")
+    if task == "prepare":
+        return None
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def throughput(task, result, book_size):
+    """Скорость этапа в единицах, удобных для сравнения"""
+    seconds = result["seconds"]
+    if task in ("parse", "pages"):
+        return (
+            f"{book_size / 1_000_000 / seconds:7.1f} MB/s "
+            f"{result['pages'] / seconds:9,.0f} стр/с"
+        )
+    if task == "library":
+        return f"{result['books'] / seconds:7.1f} книг/с"
+    return f"{result['queries'] / seconds:9,.0f} запросов/с"
+
+
+def generate_books(args):
+    args.book = os.path.join(args.tmp, "book.fb2")
+    book_size = generate_fb2(
+        args.book,
+        sections=args.sections,
+        paragraphs=args.paragraphs,
+        nesting=args.nesting,
+        depth=args.depth,
+        images=args.images,
+    )
+
+    args.library_dir = os.path.join(args.tmp, "library")
+    os.makedirs(args.library_dir)
+    for number in range(args.library_books):
+        generate_fb2(
+            os.path.join(args.library_dir, f"book{number:04}.fb2"),
+            sections=args.library_sections,
+            images=1,
+            seed=number,
+            title=f"Синтетическая книга {number}",
+        )
+    return book_size
+
+
+def main(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        args.tmp = tmp
+        book_size = generate_books(args)
+        print(
+            f"книга {book_size / 1_000_000:.1f} MB, "
+            f"библиотека из {args.library_books} книг, повторов {args.repeat}"
+        )
+
+        results = []
+        for variant in VARIANTS:
+            run_worker(variant, "prepare", args)
+            for task in args.tasks:
+                result = run_worker(variant, task, args)
+                result.update(variant=variant, task=task)
+                results.append(result)
+                print(
+                    f"{variant:>16} {task:>8}: {result['seconds']:8.3f} с  "
+                    f"{throughput(task, result, book_size)}  "
+                    f"пик RSS {result['peak_rss_mb']:7.1f} MB "
+                    f"(+{result['rss_growth_mb']:.1f})"
+                )
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "python": platform.python_version(),
+                    "book_bytes": book_size,
+                    "parameters": {
+                        name: getattr(args, name)
+                        for name in (
+                            "sections",
+                            "paragraphs",
+                            "nesting",
+                            "depth",
+                            "images",
+                            "library_books",
+                            "library_sections",
+                            "repeat",
+                        )
+                    },
+                    "results": results,
+                },
+                f,
+                ensure_ascii=False,
+                indent=2,
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sections", type=int, default=500)
+    parser.add_argument("--paragraphs", type=int, default=30)
+    parser.add_argument("--nesting", type=int, default=2)
+    parser.add_argument("--depth", type=int, default=2)
+    parser.add_argument("--images", type=int, default=3)
+    parser.add_argument("--library-books", type=int, default=50)
+    parser.add_argument("--library-sections", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--tasks", nargs="+", choices=TASKS, default=list(TASKS))
+    parser.add_argument("--json", help="сохранить результаты в JSON файл")
+    # Служебные параметры процесса, выполняющего один этап
+    parser.add_argument("--worker", nargs=2, metavar=("VARIANT", "TASK"))
+    parser.add_argument("--book")
+    parser.add_argument("--library-dir")
+    parser.add_argument("--settings-dir")
+    args = parser.parse_args()
+
+    if args.worker:
+        worker(*args.worker, args)
+    else:
+        main(args)
@@ -0,0 +1,67 @@
+"""
+Микро-бенчмарки FB2ContentIterator._render_element на патологической вложенности.
+
+Запуск из каталога lab8:
+    python benchmarks/bench_render.py
+"""
+
+import os
+import sys
+import time
+
+from lxml import etree
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "with_pattern"))
+
+from parsers.fb2 import FB2ContentIterator  # noqa: E402
+from utils import FB2_NS  # noqa: E402
+
+FB = "{%s}" % FB2_NS["fb"]
+
+
+def deep_paragraph(depth):
+    """Абзац с цепочкой emphasis/strong глубиной depth"""
+    p = etree.Element(FB + "p")
+    p.text = "начало "
+    node = p
+    for level in range(depth):
+        tag = "emphasis" if level % 2 == 0 else "strong"
+        node = etree.SubElement(node, FB + tag)
+        node.text = f"слово{level} "
+        node.tail = " хвост"
+    return p
+
+
+def wide_paragraph(width):
+    """Абзац с width соседними inline-элементами"""
+    p = etree.Element(FB + "p")
+    p.text = "начало"
+    for i in range(width):
+        child = etree.SubElement(p, FB + ("emphasis" if i % 2 else "strong"))
+        child.text = f"слово{i}"
+        child.tail = " "
+    return p
+
+
+def bench(element, repeat=5):
+    iterator = FB2ContentIterator(etree.Element(FB + "FictionBook"), FB2_NS)
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        iterator._render_element(element)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+if __name__ == "__main__":
+    for name, factory, sizes in (
+        ("глубина", deep_paragraph, (10, 100, 1_000, 10_000, 50_000)),
+        ("ширина", wide_paragraph, (10, 100, 1_000, 10_000, 100_000)),
+    ):
+        for size in sizes:
+            elapsed = bench(factory(size))
+            print(
+                f"{name} {size:>7}: {elapsed * 1000:9.3f} мс "
+                f"({elapsed / size * 1e6:.2f} мкс на элемент)"
+            )
@@ -0,0 +1,104 @@
+"""Генератор синтетических FB2 книг для замеров производительности"""
+
+import argparse
+import base64
+import os
+import random
+
+WORDS = (
+    "книга глава текст слово страница автор герой город дорога время "
+    "день ночь утро вечер море лес поле дом окно дверь письмо мысль"
+).split()
+
+
+def _paragraph(rng, words, nesting):
+    """Абзац с вложенными emphasis/strong заданной глубины"""
+    text = " ".join(rng.choice(WORDS) for _ in range(words))
+    if nesting <= 0:
+        return f"<p>{text}</p>"
+
+    inner = rng.choice(WORDS)
+    for level in range(nesting):
+        tag = "emphasis" if level % 2 == 0 else "strong"
+        inner = f"<{tag}>{rng.choice(WORDS)} {inner} {rng.choice(WORDS)}</{tag}>"
+    return f"<p>{text} {inner}</p>"
+
+
+def _section(rng, out, number, paragraphs, words, nesting, depth):
+    out.append(f"<section><title><p>Глава {number}</p></title>")
+    for i in range(paragraphs):
+        out.append(_paragraph(rng, words, nesting if i % 5 == 0 else 0))
+    if depth > 1:
+        _section(rng, out, f"{number}.1", paragraphs // 2, words, nesting, depth - 1)
+    out.append("</section>")
+
+
+def generate_fb2(
+    path,
+    sections=100,
+    paragraphs=30,
+    words=40,
+    nesting=2,
+    depth=2,
+    images=1,
+    image_size=50_000,
+    seed=1,
+    title=None,
+):
+    """
+    Запись синтетической FB2 книги.
+
+    sections и paragraphs задают объём текста, nesting — глубину вложенной
+    разметки в каждом пятом абзаце, depth — глубину вложенных секций,
+    images — число блоков <binary> размером image_size байт (первый
+    используется как обложка), title — название книги. Возвращает размер
+    файла в байтах.
+    """
+    rng = random.Random(seed)
+    title = title or f"Синтетическая книга {sections}x{paragraphs}"
+    out = [
+        '<?xml version="1.0" encoding="utf-8"?>',
+        '<FictionBook xmlns="http://www.gribuser.ru/xml/fictionbook/2.0" '
+        'xmlns:l="http://www.w3.org/1999/xlink">',
+        "<description><title-info>",
+        "<author><first-name>Иван</first-name><last-name>Синтетический</last-name></author>",
+        f"<book-title>{title}</book-title>",
+        '<coverpage><image l:href="#img0"/></coverpage>' if images else "",
+        "</title-info></description>",
+        "<body><title><p>Синтетическая книга</p></title>",
+    ]
+    for number in range(sections):
+        _section(rng, out, number + 1, paragraphs, words, nesting, depth)
+    out.append("</body>")
+
+    for number in range(images):
+        data = base64.encodebytes(rng.randbytes(image_size)).decode("ascii")
+        out.append(
+            f'<binary id="img{number}" content-type="image/jpeg">{data}</binary>'
+        )
+    out.append("</FictionBook>")
+
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("\n".join(out))
+    return os.path.getsize(path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("path")
+    parser.add_argument("--sections", type=int, default=100)
+    parser.add_argument("--paragraphs", type=int, default=30)
+    parser.add_argument("--nesting", type=int, default=2)
+    parser.add_argument("--depth", type=int, default=2)
+    parser.add_argument("--images", type=int, default=1)
+    args = parser.parse_args()
+
+    size = generate_fb2(
+        args.path,
+        sections=args.sections,
+        paragraphs=args.paragraphs,
+        nesting=args.nesting,
+        depth=args.depth,
+        images=args.images,
+    )
+    print(f"{args.path}: {size / 1_000_000:.1f} MB")
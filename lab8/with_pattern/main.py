@@ -1,30 +1,81 @@
 from ui.window import MainWindow
+from ui.book_model import BookListModel
+from ui.importer import BookImporter
+from ui.paginator import LayoutPaginator
+from ui.watcher import FolderWatcher
+from ui.widgets import PREFETCH_PAGES
+from ui.workers import (
+    BookLoader,
+    FullTextIndexer,
+    PageLayoutWorker,
+    start_worker,
+    stop_worker,
+)
 
 from models import Library
 
+from utils.database import Database
+from utils.profiler import PROFILER
 from utils.storage import Storage
-from utils.helpers import FileUtils
+from PySide6.QtCore import QObject, Slot
 from PySide6.QtWidgets import QApplication, QFontDialog
 
 import sys
+from functools import partial
 
 
-class EReaderApp:
+class EReaderApp(QObject):
     def __init__(
         self, library: Library, storage: Storage, main_window: MainWindow, app=None
     ):
+        # QObject: сигналы фоновых задач вызывают методы в потоке интерфейса
+        super().__init__()
         self.app = app
         self.main_window = main_window
 
         self.storage = storage
         self.library = library
 
+        self._current_book = None
+        self._book_loader = None
+        self._book_loader_thread = None
+        self._layout_worker = None
+        self._layout_thread = None
+        # Книга и ключ разбиения, которое считается в фоне
+        self._layout_request = None
+        self._fulltext_indexer = None
+        self._fulltext_thread = None
+        self._text_search_results = []
+        self.books_model = BookListModel(library)
+        self.folder_watcher = FolderWatcher(library, main_window)
+        self.importer = BookImporter(library, main_window)
+        self._import_progress = None
+
         self._connect_signals()
         self._load_initial_data()
 
     def _connect_signals(self):
         self.main_window.open_action.triggered.connect(self._open_book_dialog)
+        self.main_window.import_folder_action.triggered.connect(
+            self._import_folder_dialog
+        )
+        self.main_window.watch_folder_action.triggered.connect(
+            self._watch_folder_dialog
+        )
+        self.main_window.unwatch_folders_action.triggered.connect(
+            self._unwatch_folders
+        )
+        self.folder_watcher.updated.connect(self._on_folders_updated)
+        self.importer.progress.connect(self._on_import_progress)
+        self.importer.bookImported.connect(self.books_model.sync)
+        self.importer.finished.connect(self._on_import_finished)
         self.main_window.exit_action.triggered.connect(self.app.quit)
+        self.app.aboutToQuit.connect(self._stop_book_loader)
+        self.app.aboutToQuit.connect(self._stop_layout_worker)
+        self.app.aboutToQuit.connect(self._stop_fulltext_indexing)
+        self.app.aboutToQuit.connect(self.folder_watcher.stop)
+        self.app.aboutToQuit.connect(self.importer.stop)
+        self.app.aboutToQuit.connect(self.storage.close)
         self.main_window.light_theme_action.triggered.connect(
             lambda: self._change_theme("light")
         )
@@ -39,13 +90,26 @@ class EReaderApp:
         self.main_window.goto_bookmark_button.clicked.connect(self._goto_bookmark)
         self.main_window.delete_bookmark_button.clicked.connect(self._delete_bookmark)
 
-        self.main_window.books_list.itemDoubleClicked.connect(
+        self.main_window.books_list.doubleClicked.connect(
             lambda: self._open_book(self.main_window.get_selected_book_index())
         )
         self.main_window.font_size_slider.valueChanged.connect(self._change_font_size)
         self.main_window.search_input.textChanged.connect(self._search_books)
         self.main_window.sort_combo.currentTextChanged.connect(self._sort_books)
         self.main_window.font_action.triggered.connect(self._show_font_dialog)
+        self.main_window.text_area.layoutChanged.connect(self._repaginate)
+
+        self.main_window.text_search_input.returnPressed.connect(self._search_text)
+        self.main_window.goto_text_result_button.clicked.connect(
+            self._goto_text_result
+        )
+        self.main_window.text_search_results.itemDoubleClicked.connect(
+            self._goto_text_result
+        )
+        self.main_window.profiler_panel.refreshRequested.connect(
+            self._refresh_profile
+        )
+        self.main_window.profiler_panel.exportRequested.connect(self._export_profile)
 
     def _load_initial_data(self):
 
@@ -55,47 +119,103 @@ class EReaderApp:
         theme = self.storage.get_theme()
         self.main_window.apply_theme(theme)
 
-        books_data = []
-        for book in self.library.get_books():
-            books_data.append(
-                {"title": book.title, "author": book.author, "icon": book.get_icon()}
-            )
-        self.main_window.populate_books_list(books_data)
+        self.main_window.set_books_model(self.books_model)
 
         self.main_window.update_bookmarks_list(self.storage.get_bookmarks())
-        book_id, page = self.storage.get_last_session()
-        if book_id:
-            for index, book in enumerate(self.library.get_books()):
-                if book.id == book_id:
-                    self._open_book(index)
-                    break
+        book_id, position = self.storage.get_last_session()
+        book = self.library.get_book_by_id(book_id)
+        if book:
+            book.restore_position(position)
+            self._set_current_book(book)
+
+        self._start_fulltext_indexing()
+        self.folder_watcher.set_folders(self.storage.get_watched_folders())
 
     def _open_book_dialog(self):
         file_path = self.main_window.show_file_dialog()
         if file_path:
-            if not FileUtils.is_fb2_file(file_path):
+            if not self.library.is_supported(file_path):
                 self.main_window.show_error(
-                    "Ошибка", f"Файл {file_path} не является книгой в формате FB2."
+                    "Ошибка", f"Формат файла {file_path} не поддерживается."
                 )
                 return
 
             book = self.library.add_book(file_path)
 
-            books_data = []
-            for book in self.library.get_books():
-                books_data.append(
-                    {
-                        "title": book.title,
-                        "author": book.author,
-                        "icon": book.get_icon(),
-                    }
-                )
-            self.main_window.populate_books_list(books_data)
+            self.books_model.sync()
+            self._start_fulltext_indexing()
+
+            if book:
+                self._set_current_book(book)
 
-            for index, b in enumerate(self.library.get_books()):
-                if b.path == file_path:
-                    self._open_book(index)
-                    break
+    def _import_folder_dialog(self):
+        """Массовый импорт книг из выбранной папки"""
+        if self.importer.running:
+            return
+        folder = self.main_window.show_folder_dialog()
+        if not folder:
+            return
+
+        total = len(self.library.collect_book_files(folder))
+        self._import_progress = self.main_window.create_progress_dialog(
+            "Импорт книг...", total
+        )
+        self.importer.start(folder)
+
+    def _on_import_progress(self, done, total):
+        """Обновление окна прогресса по мере разбора файлов"""
+        if self._import_progress:
+            self._import_progress.setMaximum(total)
+            self._import_progress.setValue(done)
+
+    def _on_import_finished(self, imported):
+        """Завершение импорта: индексация текста новых книг"""
+        if self._import_progress:
+            self._import_progress.close()
+            self._import_progress = None
+        self._start_fulltext_indexing()
+
+        self.main_window.statusBar.showMessage(f"Импортировано книг: {imported}")
+
+    def _watch_folder_dialog(self):
+        """Добавление папки, книги из которой поддерживаются в библиотеке"""
+        folder = self.main_window.show_folder_dialog("Следить за папкой с книгами")
+        if not folder:
+            return
+
+        folders = self.storage.get_watched_folders()
+        if folder not in folders:
+            folders.append(folder)
+            self.storage.set_watched_folders(folders)
+        self.folder_watcher.set_folders(folders)
+        self.main_window.statusBar.showMessage(f"Проверка папки: {folder}...")
+
+    def _unwatch_folders(self):
+        """Отключение слежения за всеми папками; книги остаются в библиотеке"""
+        self.storage.set_watched_folders([])
+        self.folder_watcher.set_folders([])
+        self.main_window.statusBar.showMessage("Слежение за папками отключено")
+
+    def _on_folders_updated(self, summary):
+        """Обновление списка книг после изменений в отслеживаемых папках"""
+        # Удаление и замена книг сдвигают строки модели
+        self.books_model.reset()
+        book = self._current_book
+        if book is not None and self.library.get_book_by_path(book.path) is None:
+            self._close_current_book()
+        self._start_fulltext_indexing()
+        self.main_window.statusBar.showMessage(
+            f"Папки обновлены: добавлено {summary['added']}, "
+            f"изменено {summary['changed']}, удалено {summary['removed']}"
+        )
+
+    def _close_current_book(self):
+        """Закрытие книги, файл которой удалён из отслеживаемой папки"""
+        self._stop_book_loader()
+        self._stop_layout_worker()
+        self._current_book = None
+        self.storage.save_session()
+        self.main_window.clear_current_book_content()
 
     def _open_book(self, index):
         if index is None:
@@ -103,38 +223,126 @@ class EReaderApp:
 
         book = self.library.get_book_by_index(index)
         if book:
-            content = book.get_current_page_content()
-            self.main_window.set_current_book_content(
-                content, book.current_page + 1, book.total_pages
-            )
+            self._set_current_book(book)
+
+    def _set_current_book(self, book):
+        """Открытие книги и запоминание её как текущей"""
+        # Этапы открытия в этом потоке и в фоновых задачах книги
+        PROFILER.start_session("open", book.title)
+        self._current_book = book
+        self._load_book(book)
+        self.storage.save_session(book.id, book.saved_position())
+
+        self.main_window.statusBar.showMessage(f"Открытие книги: {book.title}...")
+
+    def _load_book(self, book):
+        """Фоновая загрузка книги с показом первой готовой страницы"""
+        self._stop_book_loader()
+
+        loader = BookLoader(book)
+        loader.pageReady.connect(self._on_loader_page)
+        loader.pagesCounted.connect(self._on_pages_counted)
+        loader.loaded.connect(self.main_window.statusBar.showMessage)
+
+        self._book_loader = loader
+        self._book_loader_thread = start_worker(loader, self.main_window)
+
+        self._repaginate(book)
+
+    @Slot(str, int, int)
+    def _on_loader_page(self, content, current_page, total_pages):
+        """Первая готовая страница книги из BookLoader"""
+        # Сигналы остановленной загрузки могли уже стоять в очереди
+        if self._book_loader is not None:
+            self.main_window.set_current_book_content(content, current_page, total_pages)
+
+    @Slot(int, int)
+    def _on_pages_counted(self, current_page, total_pages):
+        if self._book_loader is not None:
+            self.main_window.page_info_label.update_page_info(current_page, total_pages)
+
+    def _stop_book_loader(self):
+        """Остановка фоновой загрузки предыдущей книги"""
+        if self._book_loader:
+            stop_worker(self._book_loader, self._book_loader_thread)
+            self._book_loader = None
+            self._book_loader_thread = None
+
+    def _repaginate(self, book=None):
+        """Разбиение книги на страницы под текущий шрифт и размер окна"""
+        book = book or self._current_book
+        if book is None or not self.main_window.text_area.isVisible():
+            # После показа окна придёт resizeEvent и разбиение запустится снова
+            return
+
+        self._stop_layout_worker()
+        paginator = LayoutPaginator(*self.main_window.text_area.page_metrics())
+        if paginator.width <= 0 or paginator.height <= 0:
+            return
+
+        if book.use_layout(paginator.key):
+            # Границы для этого шрифта и размера уже посчитаны
+            self._show_page(book, book.get_current_page_content())
+            return
 
-            self.storage.save_session(book.id, book.current_page)
+        worker = PageLayoutWorker(book, paginator)
+        worker.layoutReady.connect(self._apply_layout)
+        self._layout_worker = worker
+        self._layout_request = (book, paginator.key)
+        self._layout_thread = start_worker(worker, self.main_window)
+
+    @Slot(object, object)
+    def _apply_layout(self, key, pages):
+        """Переключение текущей книги на разбиение, посчитанное в фоне"""
+        # Результат отменённого разбиения мог прийти после смены книги
+        # или размеров окна; sender() недоступен, если воркер уже удалён
+        book = self._current_book
+        if book is None or self._layout_request != (book, key):
+            return
+        book.set_layout(key, pages)
+        book.use_layout(key)
+        self._show_page(book, book.get_current_page_content())
+
+    def _stop_layout_worker(self):
+        """Остановка фонового разбиения на страницы"""
+        if self._layout_worker:
+            stop_worker(self._layout_worker, self._layout_thread)
+            self._layout_worker = None
+            self._layout_thread = None
+            self._layout_request = None
+
+    def _show_page(self, book, content):
+        """Показ текущей страницы книги и подготовка соседних"""
+        self.main_window.set_current_book_content(
+            content,
+            book.current_page + 1,
+            book.total_pages,
+            book.page_key(book.current_page),
+        )
 
-            self.main_window.statusBar.showMessage(f"Открыта книга: {book.title}")
+        pages = book.pages
+        neighbours = []
+        for offset in range(1, PREFETCH_PAGES + 1):
+            neighbours += [book.current_page + offset, book.current_page - offset]
+        self.main_window.text_area.prefetch(
+            (book.page_key(n), partial(pages.get_page, n))
+            for n in neighbours
+            if 0 <= n < pages.total_pages
+        )
 
     def _next_page(self):
         """Переход на следующую страницу"""
-        for book in self.library.get_books():
-            book_id, current_page = self.storage.get_last_session()
-            if book.id == book_id:
-                content = book.next_page()
-                self.main_window.set_current_book_content(
-                    content, book.current_page + 1, book.total_pages
-                )
-                self.storage.save_session(book.id, book.current_page)
-                break
+        book = self._current_book
+        if book:
+            self._show_page(book, book.next_page())
+            self.storage.save_session(book.id, book.saved_position())
 
     def _prev_page(self):
         """Переход на предыдущую страницу"""
-        for book in self.library.get_books():
-            book_id, current_page = self.storage.get_last_session()
-            if book.id == book_id:
-                content = book.prev_page()
-                self.main_window.set_current_book_content(
-                    content, book.current_page + 1, book.total_pages
-                )
-                self.storage.save_session(book.id, book.current_page)
-                break
+        book = self._current_book
+        if book:
+            self._show_page(book, book.prev_page())
+            self.storage.save_session(book.id, book.saved_position())
 
     def _add_bookmark(self):
         """Добавление закладки"""
@@ -145,22 +353,22 @@ class EReaderApp:
             )
             return
 
-        for book in self.library.get_books():
-            book_id, current_page = self.storage.get_last_session()
-            if book.id == book_id:
-                bookmark_data = {
-                    "text": selected_text,
-                    "book": book.title,
-                    "author": book.author,
-                    "book_id": book.id,
-                    "page": book.current_page,
-                }
-
-                self.storage.add_bookmark(bookmark_data)
-                self.main_window.update_bookmarks_list(self.storage.get_bookmarks())
+        book = self._current_book
+        if book:
+            bookmark_data = {
+                "text": selected_text,
+                "book": book.title,
+                "author": book.author,
+                "book_id": book.id,
+                # Номер страницы только для списка закладок, переход — по позиции
+                "page": book.current_page,
+                **book.saved_position(),
+            }
+
+            self.storage.add_bookmark(bookmark_data)
+            self.main_window.update_bookmarks_list(self.storage.get_bookmarks())
 
-                self.main_window.show_info("Закладка", "Закладка успешно добавлена.")
-                break
+            self.main_window.show_info("Закладка", "Закладка успешно добавлена.")
 
     def _goto_bookmark(self):
         """Переход к закладке"""
@@ -171,17 +379,16 @@ class EReaderApp:
         bookmarks = self.storage.get_bookmarks()
         if 0 <= index < len(bookmarks):
             bookmark = bookmarks[index]
-            book_id = bookmark.get("book_id")
-            page = bookmark.get("page", 0)
-
-            for book in self.library.get_books():
-                if book.id == book_id:
-                    content = book.get_page(page)
-                    self.main_window.set_current_book_content(
-                        content, book.current_page + 1, book.total_pages
-                    )
-                    self.storage.save_session(book.id, book.current_page)
-                    break
+            book = self.library.get_book_by_id(bookmark.get("book_id"))
+            if book is None:
+                return
+            book.restore_position(bookmark)
+            if book is not self._current_book:
+                self._set_current_book(book)
+                return
+
+            self._show_page(book, book.get_current_page_content())
+            self.storage.save_session(book.id, book.saved_position())
 
     def _delete_bookmark(self):
         """Удаление закладки"""
@@ -196,37 +403,57 @@ class EReaderApp:
     def _search_books(self, query):
         """Поиск книг по запросу"""
         if not query:
-            books_data = []
-            for book in self.library.get_books():
-                books_data.append(
-                    {
-                        "title": book.title,
-                        "author": book.author,
-                        "icon": book.get_icon(),
-                    }
-                )
-            self.main_window.populate_books_list(books_data)
+            self.main_window.filter_books(None)
             return
 
-        results = self.library.search_books(query)
-        books_data = []
-        for book in results:
-            books_data.append(
-                {"title": book.title, "author": book.author, "icon": book.get_icon()}
-            )
-        self.main_window.populate_books_list(books_data)
+        self.main_window.filter_books(self.library.search_books(query))
 
     def _sort_books(self, sort_option):
         """Сортировка книг по выбранному критерию"""
-        sorted_books = self.library.sort_books(sort_option)
+        self.main_window.sort_books(sort_option)
 
-        books_data = []
-        for book in sorted_books:
-            books_data.append(
-                {"title": book.title, "author": book.author, "icon": book.get_icon()}
-            )
+    def _start_fulltext_indexing(self):
+        """Запуск фоновой индексации текста новых книг"""
+        if self._fulltext_indexer and self._fulltext_indexer.running:
+            return
 
-        self.main_window.populate_books_list(books_data)
+        indexer = FullTextIndexer(self.library)
+        indexer.status.connect(self.main_window.statusBar.showMessage)
+        self._fulltext_indexer = indexer
+        self._fulltext_thread = start_worker(indexer, self.main_window)
+
+    def _stop_fulltext_indexing(self):
+        """Остановка фоновой индексации текста до закрытия базы индекса"""
+        if self._fulltext_indexer:
+            stop_worker(self._fulltext_indexer, self._fulltext_thread)
+            self._fulltext_indexer = None
+            self._fulltext_thread = None
+
+    def _search_text(self):
+        """Полнотекстовый поиск по проиндексированным книгам"""
+        query = self.main_window.text_search_input.text()
+        self._text_search_results = self.library.search_text(query)
+        for result in self._text_search_results:
+            book = result["book"]
+            # Индекс хранит страницу разбиения по символам; для свёрстанной
+            # книги номер берётся из её текущего разбиения
+            if book.has_layout:
+                result["page"] = book.find_page(result["element"])
+        self.main_window.update_text_search_results(self._text_search_results)
+        self.main_window.statusBar.showMessage(
+            f"Найдено фрагментов: {len(self._text_search_results)}"
+        )
+
+    def _goto_text_result(self):
+        """Открытие книги на странице с найденным фрагментом"""
+        index = self.main_window.get_selected_text_result_index()
+        if index is None or index >= len(self._text_search_results):
+            return
+
+        result = self._text_search_results[index]
+        book = result["book"]
+        book.set_position(result["element"], result.get("offset", 0))
+        self._set_current_book(book)
 
     def _change_font_size(self, size):
         """Изменение размера шрифта"""
@@ -250,6 +477,21 @@ class EReaderApp:
             self.storage.set_font_size(selected_font.pointSize())
             self.main_window.set_font_size(selected_font.pointSize())
 
+    def _refresh_profile(self):
+        self.main_window.profiler_panel.set_sessions(PROFILER.sessions())
+
+    def _export_profile(self):
+        file_path = self.main_window.show_save_dialog(
+            "Экспорт замеров", "profile.json", "JSON (*.json)"
+        )
+        if not file_path:
+            return
+        try:
+            PROFILER.export_json(file_path)
+            self.main_window.statusBar.showMessage(f"Замеры сохранены: {file_path}")
+        except Exception as e:
+            print(f"Ошибка при экспорте замеров: {e}")
+
     def run(self):
         """Запуск приложения"""
         self.main_window.show()
@@ -261,11 +503,15 @@ if __name__ == "__main__":
 
     app = QApplication(sys.argv)
 
-    library = Library(settings_dir)
-    storage = Storage(settings_dir)
+    # Библиотека и хранилище настроек работают с одной базой
+    database = Database(settings_dir)
+    library = Library(settings_dir, database)
+    storage = Storage(settings_dir, database)
     main_window = MainWindow()
 
     ereader_app = EReaderApp(
         library=library, storage=storage, main_window=main_window, app=app
     )
+    # После storage.close: отложенная сессия уже записана
+    app.aboutToQuit.connect(database.close)
     sys.exit(ereader_app.run())
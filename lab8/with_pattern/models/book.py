@@ -1,76 +1,309 @@
 import os
 import datetime
+import threading
+from collections import OrderedDict
 
 from parsers import AbstractFormatter
+from parsers.pagination import PageProvider
 from utils import handle_errors
+from utils.profiler import PROFILER
+
+LAYOUT_CACHE_SIZE = 8
 
 
 class Book:
-    def __init__(self, path, formatter: AbstractFormatter, book_id=None):
+    def __init__(
+        self,
+        path,
+        formatter: AbstractFormatter,
+        book_id=None,
+        cache=None,
+        preloaded=None,
+    ):
         self.path = path
         self.title = "Неизвестная книга"
         self.author = "Неизвестный автор"
         self.date_added = datetime.datetime.now().isoformat()
         self.cover_image = None
+        # Время модификации и размер файла при последнем разборе
+        self.signature = None
         self.id = book_id or os.path.basename(path)
-        self.current_page = 0
-        self.total_pages = 0
-        self.content = []
+        self._current_page = 0
+        # Позиция чтения (индекс элемента, смещение в символах); None —
+        # начало текущей страницы, вычисляется при первом обращении
+        self._position = (0, 0)
+        self._content = None
+        self._cover_id = None
+        self._layout = None
+        self._layout_key = None
+        # Границы страниц для последних использованных шрифтов и размеров
+        self._layouts = OrderedDict()
+        self._layout_metrics = {}
 
         self._formatter = formatter
-        self.parse_book()
+        self._cache = cache
+        self._content_cached = False
+        # Повторно входимая: update_cache обращается к content под блокировкой.
+        # Ею же защищена позиция чтения: её меняет и поток загрузки книги
+        self._content_lock = threading.RLock()
+
+        cached = cache.load(path) if cache else None
+        if cached:
+            self._apply_cache(cached)
+        else:
+            if preloaded:
+                # Метаданные уже прочитаны заранее (например, при массовом импорте)
+                self._apply_cache(preloaded)
+            else:
+                # Текст книги разбирается только при первом обращении к content
+                self.load_metadata()
+            if cache:
+                cache.save(self)
+
+    def load_metadata(self):
+        """Чтение названия, автора и ссылки на обложку без разбора текста"""
+        result = self._formatter.parse_metadata(self.path)
+        if result:
+            self.title = result["metadata"].get("title", "Неизвестная книга")
+            self.author = result["metadata"].get("author", "Неизвестный автор")
+            self._cover_id = result.get("cover_id")
+
+    def _apply_cache(self, cached):
+        """Восстановление книги из кэша без разбора файла"""
+        self.title = cached["metadata"].get("title", self.title)
+        self.author = cached["metadata"].get("author", self.author)
+        # В записи кэша ссылка на обложку лежит в metadata, в результате
+        # parse_metadata — рядом с ней; сама обложка читается по требованию
+        self._cover_id = cached["metadata"].get("cover_id") or cached.get("cover_id")
+
+    @property
+    def content(self) -> PageProvider:
+        """Страницы книги; файл разбирается при первом обращении"""
+        with self._content_lock:
+            if self._content is None:
+                self._load_content()
+        return self._content
+
+    def _load_content(self):
+        """Разметка страниц из кэша, а если её нет — разбор файла"""
+        with PROFILER.stage("cache"):
+            cached = self._cache.load_content(self.path) if self._cache else None
+        if cached:
+            self._content = PageProvider.from_state(cached["elements"], cached["pages"])
+            self._content_cached = True
+        else:
+            self.parse_book()
 
     def parse_book(self):
-        result = self._formatter.parse(self.path)
+        result = self._formatter.parse(self.path, lazy=True)
         if result:
             self.title = result["metadata"].get("title", "Неизвестная книга")
             self.author = result["metadata"].get("author", "Неизвестный автор")
 
-            self.content = result["content"]
-            self.total_pages = result["total_pages"]
+            content = result["content"]
+            if isinstance(content, list):
+                content = PageProvider.from_pages(content)
+            self._content = content
+
+            if self.cover_image is None:
+                self.cover_image = result["cover"]
+                self._cover_id = result.get("cover_id")
+        else:
+            self._content = PageProvider.from_pages([])
+
+    def update_cache(self):
+        """
+        Сохранение разметки страниц в кэш, когда книга дочитана до конца.
+
+        Вызывается потоком загрузки книги; разметка пишется один раз, а файл
+        записывается без блокировки, чтобы не задерживать перелистывание.
+        """
+        with self._content_lock:
+            if not self._cache or self._content_cached or not self.content.is_complete:
+                return
+            state = self.content.export_state()
+            self._content_cached = True
+        self._cache.save_content(self.path, state)
+
+    @property
+    def pages(self) -> PageProvider:
+        """Текущее разбиение на страницы: по вёрстке, если оно уже готово"""
+        return self._layout or self.content
+
+    @property
+    def has_layout(self):
+        """Готово ли разбиение на страницы по вёрстке"""
+        return self._layout is not None
+
+    def get_layout_metrics(self, measure_key):
+        """Сохранённые замеры элементов для шрифта и ширины"""
+        return self._layout_metrics.get(measure_key)
+
+    def set_layout_metrics(self, measure_key, metrics):
+        # Замеры занимают память пропорционально книге: храним последние
+        self._layout_metrics = {measure_key: metrics}
+
+    def set_layout(self, key, pages):
+        """Сохранение границ страниц для шрифта и размеров области чтения"""
+        self._layouts[key] = pages
+        self._layouts.move_to_end(key)
+        if len(self._layouts) > LAYOUT_CACHE_SIZE:
+            self._layouts.popitem(last=False)
+
+    def use_layout(self, key):
+        """
+        Переключение на разбиение из кэша с сохранением позиции чтения.
 
-            self.cover_image = result["cover"]
+        Возвращает False, если для ключа границы страниц ещё не посчитаны.
+        """
+        pages = self._layouts.get(key)
+        if pages is None:
+            return False
+        self._layouts.move_to_end(key)
+
+        with self._content_lock:
+            # Позиция не пересчитывается из номера страницы, поэтому
+            # при повторных сменах разбиения место чтения не сдвигается
+            element, offset = self.position
+            self._layout = self.content.with_pages(pages)
+            self._layout_key = key
+            self.set_position(element, offset)
+        return True
+
+    def page_key(self, page_num):
+        """Ключ страницы, уникальный для книги и её текущего разбиения"""
+        return (self.path, self._layout_key, page_num)
+
+    def find_page(self, element):
+        """Номер страницы в текущем разбиении для индекса элемента"""
+        return self.pages.find_page(element)
+
+    @property
+    def current_page(self):
+        """Номер текущей страницы в текущем разбиении"""
+        with self._content_lock:
+            if self._current_page is None:
+                # Страницы не разрывают элементы: страницу задаёт индекс элемента
+                self._current_page = self.find_page(self._position[0])
+            return self._current_page
+
+    @current_page.setter
+    def current_page(self, page_num):
+        with self._content_lock:
+            self._current_page = page_num
+            self._position = None
+
+    @property
+    def position(self):
+        """
+        Позиция чтения, не зависящая от разбиения на страницы.
+
+        Пара (индекс элемента, смещение в символах внутри элемента).
+        После перелистывания это начало текущей страницы.
+        """
+        with self._content_lock:
+            if self._position is None:
+                self._position = (self.pages.page_start(self._current_page), 0)
+            return self._position
+
+    def set_position(self, element, offset=0):
+        """Переход к позиции; номер страницы ищется при первом обращении"""
+        with self._content_lock:
+            self._position = (element, offset)
+            self._current_page = None
+
+    def restore_position(self, saved):
+        """
+        Позиция из сохранённой записи (сессия, закладка, библиотека).
+
+        Старые записи хранят только номер страницы "page".
+        """
+        if saved.get("element") is not None:
+            self.set_position(saved["element"], saved.get("offset", 0))
+        else:
+            self.current_page = saved.get("page", 0)
+
+    def saved_position(self):
+        """Запись позиции для сохранения без разбора ещё не открытой книги"""
+        with self._content_lock:
+            if self._position is None and self._content is None:
+                return {"page": self._current_page}
+            element, offset = self.position
+        return {"element": element, "offset": offset}
+
+    @property
+    def total_pages(self):
+        """Количество страниц, известных на данный момент"""
+        return self.pages.total_pages
 
     def get_current_page_content(self):
-        if not self.content or self.current_page >= len(self.content):
+        with self._content_lock:
+            page_num = self.current_page
+        content = self.pages.get_page(page_num)
+        if content is None:
             return "Нет содержимого для отображения."
-        return self.content[self.current_page]
+        return content
 
     def get_page(self, page_num):
         """Получение содержимого указанной страницы"""
-        if page_num < 0 or page_num >= self.total_pages:
+        if not self.pages.has_page(page_num):
             return None
         self.current_page = page_num
-        return self.content[page_num]
+        return self.get_current_page_content()
 
     def next_page(self):
         """Переход на следующую страницу"""
-        if self.current_page < self.total_pages - 1:
-            self.current_page += 1
+        with self._content_lock:
+            if self.pages.has_page(self.current_page + 1):
+                self.current_page += 1
         return self.get_current_page_content()
 
     def prev_page(self):
         """Переход на предыдущую страницу"""
-        if self.current_page > 0:
-            self.current_page -= 1
+        with self._content_lock:
+            if self.current_page > 0:
+                self.current_page -= 1
         return self.get_current_page_content()
 
     @handle_errors
     def get_icon(self):
         """Получение иконки книги из обложки"""
-        return self._formatter.get_icon_from_cover(self.cover_image)
+        return self._formatter.get_icon_from_cover(self.get_cover_image())
 
     def get_cover_image(self):
         """Получение данных обложки"""
+        if self.cover_image is None and self._cover_id:
+            # Полноразмерная обложка нужна один раз для миниатюры IconCache,
+            # поэтому прочитанная по cover_id в книге не хранится
+            return self._formatter.load_cover(self.path, self._cover_id)
         return self.cover_image
 
+    def iter_elements(self):
+        """Поток элементов текста книги без разбиения на страницы"""
+        return self._formatter.iter_elements(self.path)
+
+    def to_cache_dict(self):
+        """Метаданные книги для BookCache; текст сохраняет update_cache"""
+        return {
+            "metadata": {
+                "title": self.title,
+                "author": self.author,
+                "cover_id": self._cover_id,
+            },
+        }
+
     def to_dict(self):
         """Сериализация книги в словарь для сохранения"""
+        saved = self.saved_position()
         return {
             "id": self.id,
             "path": self.path,
             "title": self.title,
             "author": self.author,
             "date_added": self.date_added,
-            "current_page": self.current_page,
+            "current_page": saved.get("page", 0),
+            "element": saved.get("element"),
+            "offset": saved.get("offset", 0),
+            "mtime": (self.signature or {}).get("mtime"),
+            "size": (self.signature or {}).get("size"),
         }
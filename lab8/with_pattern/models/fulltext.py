@@ -0,0 +1,210 @@
+import re
+import sqlite3
+import threading
+from contextlib import closing
+
+from parsers.pagination import PageProvider
+from utils import handle_errors
+
+TAG_RE = re.compile(r"<[^>]+>")
+TERM_RE = re.compile(r"\w+")
+SNIPPET_RADIUS = 60
+
+
+def normalize_term(term):
+    """Приведение слова к виду для индекса"""
+    return term.casefold().replace("ё", "е")
+
+
+def html_to_text(html):
+    """Текст элемента без HTML-разметки"""
+    return " ".join(TAG_RE.sub(" ", html).split())
+
+
+class FullTextIndex:
+    """
+    Инвертированный индекс по тексту книг.
+
+    Для каждого слова хранится книга, страница, номер элемента и смещение
+    первого вхождения внутри элемента. Текст элементов сохраняется вместе
+    с индексом, чтобы показывать фрагменты результатов без повторного
+    разбора FB2.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS books (
+            id INTEGER PRIMARY KEY,
+            book_key TEXT NOT NULL UNIQUE,
+            signature TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS terms (
+            id INTEGER PRIMARY KEY,
+            term TEXT NOT NULL UNIQUE
+        );
+        CREATE TABLE IF NOT EXISTS elements (
+            book_id INTEGER NOT NULL,
+            element INTEGER NOT NULL,
+            page INTEGER NOT NULL,
+            text TEXT NOT NULL,
+            PRIMARY KEY (book_id, element)
+        ) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS postings (
+            term_id INTEGER NOT NULL,
+            book_id INTEGER NOT NULL,
+            element INTEGER NOT NULL,
+            offset INTEGER NOT NULL,
+            PRIMARY KEY (term_id, book_id, element)
+        ) WITHOUT ROWID;
+    """
+
+    def __init__(self, db_file):
+        self.db_file = db_file
+        self._lock = threading.Lock()
+        with self._connect() as connection:
+            connection.executescript(self.SCHEMA)
+
+    def _connect(self):
+        # Отдельное соединение на операцию: индекс наполняется из фонового потока
+        return closing(sqlite3.connect(self.db_file))
+
+    def is_indexed(self, book_key, signature):
+        """Проверка, что книга проиндексирована в текущей версии файла"""
+        with self._lock, self._connect() as connection:
+            row = connection.execute(
+                "SELECT signature FROM books WHERE book_key = ?", (book_key,)
+            ).fetchone()
+        return row is not None and row[0] == signature
+
+    def index_book(self, book_key, signature, elements):
+        """Индексация книги по потоку элементов FB2ContentIterator"""
+        content = PageProvider(elements)
+        content.load_all()
+        state = content.export_state()
+
+        element_rows = []
+        postings = {}
+        for page, (start, end) in enumerate(state["pages"]):
+            for element in range(start, end):
+                text = html_to_text(state["elements"][element])
+                if not text:
+                    continue
+                element_rows.append((element, page, text))
+                for match in TERM_RE.finditer(text):
+                    postings.setdefault(
+                        (normalize_term(match.group()), element), match.start()
+                    )
+
+        with self._lock, self._connect() as connection, connection:
+            self._delete(connection, book_key)
+            book_id = connection.execute(
+                "INSERT INTO books (book_key, signature) VALUES (?, ?)",
+                (book_key, signature),
+            ).lastrowid
+            term_ids = self._get_term_ids(connection, {term for term, _ in postings})
+
+            connection.executemany(
+                "INSERT INTO elements VALUES (?, ?, ?, ?)",
+                ((book_id, *row) for row in element_rows),
+            )
+            connection.executemany(
+                "INSERT INTO postings VALUES (?, ?, ?, ?)",
+                (
+                    (term_ids[term], book_id, element, offset)
+                    for (term, element), offset in postings.items()
+                ),
+            )
+
+    @staticmethod
+    def _get_term_ids(connection, terms):
+        """Идентификаторы слов с добавлением новых в словарь"""
+        connection.executemany(
+            "INSERT OR IGNORE INTO terms (term) VALUES (?)", ((t,) for t in terms)
+        )
+        term_ids = {}
+        terms = list(terms)
+        for start in range(0, len(terms), 500):
+            chunk = terms[start : start + 500]
+            placeholders = ",".join("?" * len(chunk))
+            term_ids.update(
+                connection.execute(
+                    f"SELECT term, id FROM terms WHERE term IN ({placeholders})", chunk
+                )
+            )
+        return term_ids
+
+    def remove(self, book_key):
+        """Удаление книги из индекса"""
+        with self._lock, self._connect() as connection, connection:
+            self._delete(connection, book_key)
+
+    @staticmethod
+    def _delete(connection, book_key):
+        row = connection.execute(
+            "SELECT id FROM books WHERE book_key = ?", (book_key,)
+        ).fetchone()
+        if row is None:
+            return
+        for table in ("postings", "elements"):
+            connection.execute(f"DELETE FROM {table} WHERE book_id = ?", row)
+        connection.execute("DELETE FROM books WHERE id = ?", row)
+
+    @handle_errors
+    def search(self, query, limit=100):
+        """
+        Поиск фрагментов, содержащих все слова запроса.
+
+        Последнее слово запроса ищется как префикс, чтобы результаты
+        появлялись по мере набора. Возвращает словари с ключом книги,
+        страницей, смещением и фрагментом текста.
+        """
+        terms = [normalize_term(term) for term in TERM_RE.findall(query)]
+        if not terms:
+            return []
+
+        conditions = []
+        params = []
+        for i, term in enumerate(terms):
+            if i == len(terms) - 1:
+                conditions.append("term >= ? AND term < ?")
+                params.extend([term, term + "\uffff"])
+            else:
+                conditions.append("term = ?")
+                params.append(term)
+
+        selects = [
+            "SELECT book_id, element FROM postings "
+            f"WHERE term_id IN (SELECT id FROM terms WHERE {condition})"
+            for condition in conditions
+        ]
+
+        with self._lock, self._connect() as connection:
+            hits = connection.execute(
+                " INTERSECT ".join(selects) + " ORDER BY 1, 2 LIMIT ?",
+                params + [limit],
+            ).fetchall()
+
+            first_params = params[:2] if len(terms) == 1 else params[:1]
+            results = []
+            for book_id, element in hits:
+                book_key, page, text, offset = connection.execute(
+                    "SELECT b.book_key, e.page, e.text, "
+                    "(SELECT MIN(p.offset) FROM postings p "
+                    f"WHERE p.term_id IN (SELECT id FROM terms WHERE {conditions[0]}) "
+                    "AND p.book_id = e.book_id AND p.element = e.element) "
+                    "FROM elements e JOIN books b ON b.id = e.book_id "
+                    "WHERE e.book_id = ? AND e.element = ?",
+                    first_params + [book_id, element],
+                ).fetchone()
+
+                start = max(offset - SNIPPET_RADIUS, 0)
+                results.append(
+                    {
+                        "book_key": book_key,
+                        "page": page,
+                        "element": element,
+                        "offset": offset,
+                        "snippet": ("…" if start else "")
+                        + text[start : offset + SNIPPET_RADIUS],
+                    }
+                )
+        return results
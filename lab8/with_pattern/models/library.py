@@ -1,28 +1,63 @@
 import os
-import json
+import threading
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
 from .book import Book
+from .search import SEARCH_LIMIT, SearchIndex
+from .fulltext import FullTextIndex
 from utils import handle_errors
-from typing import List, Dict, Type
+from typing import List, Dict
 from parsers import AbstractFormatter
-from parsers.fb2 import FB2Formatter
+from parsers.registry import get_formatter_class
+from utils.cache import BookCache, IconCache, file_signature
+from utils.database import Database
+from utils.profiler import PROFILER
+
+
+def _read_book_metadata(formatter_class, file_path):
+    """Чтение метаданных книги в дочернем процессе"""
+    formatter = formatter_class()
+    # Подпись до разбора: изменение файла во время чтения заметит следующая проверка
+    signature = file_signature(file_path)
+    result = formatter.parse_metadata(file_path)
+    result["signature"] = signature
+    # Обложка не передаётся между процессами: IconCache декодирует её
+    # по cover_id при первом показе иконки
+    return result
 
 
 class Library:
-    def __init__(self, settings_dir=".settings"):
+    def __init__(self, settings_dir=".settings", database=None):
         self.books = []
+        self._books_by_path: Dict[str, Book] = {}
+        self._books_by_id: Dict[str, Book] = {}
         self.settings_dir = settings_dir
-        self._formatters: Dict[str, Type[AbstractFormatter]] = {".fb2": FB2Formatter}
+        # Импорт идёт в фоновом потоке, пока интерфейс ищет книги
+        # и применяет изменения отслеживаемых папок
+        self._lock = threading.RLock()
 
         if not os.path.exists(settings_dir):
             os.makedirs(settings_dir)
 
-        self.library_file = os.path.join(settings_dir, "library.json")
+        self._db = database or Database(settings_dir)
+        self._search_index = SearchIndex()
+        # Прежние версии сохраняли поисковый индекс в файл; теперь он
+        # строится в памяти при загрузке библиотеки
+        legacy_index_file = os.path.join(settings_dir, "search_index.json")
+        if os.path.exists(legacy_index_file):
+            os.remove(legacy_index_file)
+        self.fulltext = FullTextIndex(os.path.join(settings_dir, "fulltext.db"))
+        self._cache = BookCache(settings_dir)
+        self._icons = IconCache(self._cache)
         self.load_library()
 
+    @staticmethod
+    def is_supported(file_path: str) -> bool:
+        """Есть ли зарегистрированный разбор для формата файла"""
+        return get_formatter_class(file_path) is not None
+
     def _get_formatter(self, file_path: str) -> AbstractFormatter:
-        _, ext = os.path.splitext(file_path.lower())
-        formatter_class = self._formatters.get(ext)
+        formatter_class = get_formatter_class(file_path)
 
         if formatter_class:
             return formatter_class()
@@ -30,18 +65,276 @@ class Library:
 
     @handle_errors
     def add_book(self, file_path) -> Book:
-        for book in self.books:
-            if book.path == file_path:
-                return book
+        if file_path in self._books_by_path:
+            return self._books_by_path[file_path]
         formatter = self._get_formatter(file_path)
         if not formatter:
             raise ValueError(f"Неподдерживаемый формат файла: {file_path}")
 
-        book = Book(file_path, formatter)
+        book = Book(file_path, formatter, cache=self._cache)
+        book.signature = file_signature(file_path)
+        with self._lock:
+            self._append_book(book)
+        self._db.save_book(book.to_dict())
+        return book
+
+    def _append_book(self, book: Book):
+        """Добавление книги в список и индексы библиотеки"""
+        if book.id in self._books_by_id:
+            book.id = self._unique_book_id(book.path)
         self.books.append(book)
-        self.save_library()
+        self._books_by_path[book.path] = book
+        self._books_by_id[book.id] = book
+        self._search_index.add(book.path, book.title, book.author)
+
+    def _unique_book_id(self, path):
+        """Имя файла книги; одноимённые файлы из разных папок получают номер"""
+        name = os.path.basename(path)
+        book_id, number = name, 2
+        while book_id in self._books_by_id:
+            book_id = f"{name} ({number})"
+            number += 1
+        return book_id
+
+    def collect_book_files(self, paths) -> List[str]:
+        """Список поддерживаемых файлов из путей к файлам и папкам"""
+        if isinstance(paths, str):
+            paths = [paths]
+
+        files = []
+        for path in paths:
+            if os.path.isdir(path):
+                for dir_path, _, file_names in os.walk(path):
+                    for file_name in sorted(file_names):
+                        files.append(os.path.join(dir_path, file_name))
+            else:
+                files.append(path)
+
+        return [path for path in files if self.is_supported(path)]
+
+    def import_books(
+        self, paths, progress_callback=None, max_workers=None, is_cancelled=None
+    ):
+        """
+        Массовый импорт книг из списка файлов или папки.
+
+        Файлы разбираются параллельно в пуле процессов, готовые книги
+        добавляются по мере поступления, а progress_callback(done, total, book)
+        вызывается после каждой из них. В базу одной транзакцией записываются
+        только новые книги. Можно вызывать из фонового потока; если
+        is_cancelled() вернёт True, сохраняются уже добавленные книги.
+        """
+        files = [
+            path
+            for path in self.collect_book_files(paths)
+            if path not in self._books_by_path
+        ]
+        imported = []
+        if not files:
+            return imported
+
+        paths = list(dict.fromkeys(files))
+        results = self.read_books_metadata(paths, max_workers)
+        for done, (path, result) in enumerate(results, start=1):
+            if is_cancelled and is_cancelled():
+                break
+            book = None
+            if result is not None:
+                try:
+                    book = self._create_book(path, result)
+                except Exception as e:
+                    print(f"Ошибка при импорте книги {path}: {e}")
+
+            if book is not None:
+                with self._lock:
+                    # Отслеживаемая папка могла добавить файл, пока он разбирался
+                    if path in self._books_by_path:
+                        book = None
+                    else:
+                        self._append_book(book)
+                        imported.append(book)
+
+            if progress_callback:
+                progress_callback(done, len(paths), book)
+
+        if imported:
+            self._db.save_books([book.to_dict() for book in imported])
+        return imported
+
+    def read_books_metadata(self, paths, max_workers=None):
+        """
+        Параллельное чтение метаданных в пуле процессов.
+
+        Выдаёт пары (path, result) по мере готовности; result равен None,
+        если файл не удалось разобрать.
+        """
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                executor.submit(_read_book_metadata, get_formatter_class(path), path): path
+                for path in paths
+            }
+            try:
+                for future in as_completed(futures):
+                    path = futures[future]
+                    try:
+                        yield path, future.result()
+                    except Exception as e:
+                        print(f"Ошибка при чтении книги {path}: {e}")
+                        yield path, None
+            finally:
+                # Прерванный перебор (отмена проверки папок) ждёт только
+                # уже начатые файлы, а не всю очередь
+                executor.shutdown(cancel_futures=True)
+
+    def _create_book(self, path, result, book_id=None) -> Book:
+        """Книга из заранее прочитанных метаданных"""
+        signature = result.pop("signature", None)
+        book = Book(
+            path,
+            self._get_formatter(path),
+            book_id,
+            cache=self._cache,
+            preloaded=result,
+        )
+        book.signature = signature or file_signature(path)
         return book
 
+    def diff_folder(self, folder) -> Dict[str, List[str]]:
+        """
+        Новые, изменённые и удалённые файлы книг папки относительно библиотеки.
+
+        Файлы сравниваются по времени модификации и размеру, поэтому
+        проверка не читает сами книги. Недоступная папка (например,
+        отключённый сетевой диск) не считается опустевшей.
+        """
+        changes = {"added": [], "changed": [], "removed": []}
+        if not os.path.isdir(folder):
+            return changes
+
+        on_disk = set()
+        for path in self.collect_book_files(folder):
+            try:
+                signature = file_signature(path)
+            except OSError:
+                continue
+            on_disk.add(path)
+            book = self._books_by_path.get(path)
+            if book is None:
+                changes["added"].append(path)
+            elif book.signature != signature:
+                changes["changed"].append(path)
+
+        prefix = os.path.join(os.path.abspath(folder), "")
+        changes["removed"] = [
+            book.path
+            for book in list(self.books)
+            if os.path.abspath(book.path).startswith(prefix) and book.path not in on_disk
+        ]
+        return changes
+
+    def apply_folder_changes(self, changes, metadata) -> Dict[str, int]:
+        """
+        Обновление только затронутых записей библиотеки.
+
+        metadata — результаты read_books_metadata для новых и изменённых
+        файлов. Вызывается из потока интерфейса, который читает self.books.
+        """
+        with self._lock:
+            summary = {"added": 0, "changed": 0, "removed": 0}
+            saved = []
+
+            for path in changes["added"]:
+                if path in self._books_by_path or metadata.get(path) is None:
+                    continue
+                try:
+                    book = self._create_book(path, metadata[path])
+                except Exception as e:
+                    print(f"Ошибка при добавлении книги {path}: {e}")
+                    continue
+                self._append_book(book)
+                saved.append(book)
+                summary["added"] += 1
+
+            for path in changes["changed"]:
+                old_book = self._books_by_path.get(path)
+                if old_book is None or metadata.get(path) is None:
+                    continue
+                try:
+                    book = self._create_book(path, metadata[path], old_book.id)
+                except Exception as e:
+                    print(f"Ошибка при обновлении книги {path}: {e}")
+                    continue
+                self._replace_book(old_book, book)
+                saved.append(book)
+                summary["changed"] += 1
+
+            summary["removed"] = self.remove_books(changes["removed"])
+
+            if saved:
+                self._db.save_books([book.to_dict() for book in saved])
+            return summary
+
+    def _replace_book(self, old_book: Book, book: Book):
+        """Замена записи изменившейся книги с сохранением даты и позиции"""
+        book.date_added = old_book.date_added
+        book.restore_position(old_book.saved_position())
+
+        self.books[self.books.index(old_book)] = book
+        self._books_by_path[book.path] = book
+        if self._books_by_id.get(book.id) is old_book:
+            self._books_by_id[book.id] = book
+        self._search_index.remove(book.path)
+        self._search_index.add(book.path, book.title, book.author)
+        self._icons.invalidate(book.path)
+
+    def remove_books(self, paths) -> int:
+        """Удаление книг из библиотеки и индексов; возвращает число удалённых"""
+        with self._lock:
+            removed = {path for path in paths if path in self._books_by_path}
+            if not removed:
+                return 0
+
+            self.books = [book for book in self.books if book.path not in removed]
+            self._books_by_id = {book.id: book for book in self.books}
+            for path in removed:
+                del self._books_by_path[path]
+                self._search_index.remove(path)
+                self._icons.invalidate(path)
+                self.fulltext.remove(path)
+
+            self._db.remove_books(removed)
+            return len(removed)
+
+    def get_icon(self, book: Book):
+        """Иконка обложки книги из кэша миниатюр"""
+        return self._icons.get(book)
+
+    def get_books_pending_fulltext(self) -> List[Book]:
+        """Книги, которые ещё не проиндексированы для полнотекстового поиска"""
+        return [
+            book
+            for book in self.books
+            if os.path.exists(book.path)
+            and not self.fulltext.is_indexed(book.path, str(file_signature(book.path)))
+        ]
+
+    @handle_errors
+    def index_book_text(self, book: Book):
+        """Построение полнотекстового индекса книги"""
+        self.fulltext.index_book(
+            book.path, str(file_signature(book.path)), book.iter_elements()
+        )
+
+    def search_text(self, query, limit=100) -> List[Dict]:
+        """Полнотекстовый поиск по проиндексированным книгам"""
+        results = []
+        for hit in self.fulltext.search(query, limit) or []:
+            book = self._books_by_path.get(hit["book_key"])
+            if book:
+                hit["book"] = book
+                results.append(hit)
+        return results
+
     def get_books(self) -> List[Book]:
         return self.books
 
@@ -50,15 +343,26 @@ class Library:
             return self.books[index]
         return None
 
-    def search_books(self, query) -> List[Book]:
-        query = query.lower()
-        results = []
+    def get_book_by_path(self, path) -> Book:
+        """Книга по пути к файлу или None, если её нет в библиотеке"""
+        return self._books_by_path.get(path)
 
-        for book in self.books:
-            if query in book.title.lower() or query in book.author.lower():
-                results.append(book)
+    def get_book_by_id(self, book_id) -> Book:
+        """Книга по идентификатору"""
+        return self._books_by_id.get(book_id)
 
-        return results
+    def search_books(self, query, limit=SEARCH_LIMIT) -> List[Book]:
+        """
+        Поиск по названию и автору; результаты упорядочены по релевантности.
+
+        Возвращается не больше limit самых релевантных книг, None снимает ограничение.
+        """
+        with self._lock:
+            return [
+                self._books_by_path[path]
+                for path in self._search_index.search(query, limit)
+                if path in self._books_by_path
+            ]
 
     def sort_books(self, sort_option) -> List[Book]:
         """
@@ -84,26 +388,53 @@ class Library:
 
     @handle_errors
     def load_library(self):
-        if not os.path.exists(self.library_file):
-            return
-
-        with open(self.library_file, "r", encoding="utf-8") as f:
-            data = json.load(f)
-            self.books = []
-            for book_data in data.get("books", []):
-                book_path = book_data.get("path", "")
+        """Загрузка книг из базы; длительность этапов пишется в профилировщик"""
+        PROFILER.start_session("library", "Загрузка библиотеки")
+        self.books = []
+        self._books_by_path = {}
+        self._books_by_id = {}
+        renamed = []
+        with PROFILER.stage("database") as stage:
+            rows = self._db.load_books()
+            stage.size = len(rows)
+
+        with PROFILER.stage("books", len(rows)):
+            for book_data in rows:
+                book_path = book_data["path"]
                 formatter = self._get_formatter(book_path)
                 if formatter:
-                    book = Book(book_path, formatter, book_data.get("id"))
-                    book.title = book_data.get("title", "Неизвестная книга")
-                    book.author = book_data.get("author", "Неизвестный автор")
-                    book.date_added = book_data.get("date_added", "")
-                    book.current_page = book_data.get("current_page", 0)
+                    book = Book(
+                        book_path, formatter, book_data["id"], cache=self._cache
+                    )
+                    book.title = book_data["title"]
+                    book.author = book_data["author"]
+                    book.date_added = book_data["date_added"]
+                    if book_data["mtime"] is not None:
+                        book.signature = {
+                            "mtime": book_data["mtime"],
+                            "size": book_data["size"],
+                        }
+                    book.restore_position(
+                        {
+                            "page": book_data["current_page"],
+                            "element": book_data["element"],
+                            "offset": book_data["offset"],
+                        }
+                    )
+                    if book.id in self._books_by_id:
+                        # Базы прошлых версий давали одноимённым файлам один id
+                        book.id = self._unique_book_id(book_path)
+                        renamed.append(book)
                     self.books.append(book)
+                    self._books_by_path[book.path] = book
+                    self._books_by_id[book.id] = book
+
+        if renamed:
+            self._db.save_books([book.to_dict() for book in renamed])
+
+        with PROFILER.stage("search_index", len(self.books)):
+            self._search_index.rebuild(self.books)
 
     @handle_errors
     def save_library(self):
-        data = {"books": [book.to_dict() for book in self.books]}
-
-        with open(self.library_file, "w", encoding="utf-8") as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
+        self._db.save_books([book.to_dict() for book in self.books])
@@ -0,0 +1,125 @@
+import heapq
+
+GRAM_SIZE = 3
+# Сколько самых релевантных книг возвращает поиск по умолчанию
+SEARCH_LIMIT = 500
+
+
+def normalize(text):
+    """Приведение строки к виду для поиска: регистр, ё/е и пробелы"""
+    return " ".join((text or "").casefold().replace("ё", "е").split())
+
+
+class SearchIndex:
+    """
+    Индекс поиска по названиям и авторам книг.
+
+    Для каждой книги хранятся нормализованные название и автор, а также
+    n-граммы длиной GRAM_SIZE. Запрос сводится к пересечению списков книг
+    для его n-грамм с последующей проверкой подстроки, поэтому полный
+    проход по библиотеке нужен только для запросов короче GRAM_SIZE.
+
+    Индекс живёт в памяти и строится при загрузке библиотеки: это быстрее,
+    чем читать и записывать его в файл.
+    """
+
+    def __init__(self):
+        self._entries = {}
+        self._grams = {}
+
+    @staticmethod
+    def _grams_of(entry):
+        text = f"{entry[0]}\n{entry[1]}"
+        return {text[start : start + GRAM_SIZE] for start in range(len(text) - GRAM_SIZE + 1)}
+
+    def add(self, key, title, author):
+        """Добавление или обновление книги в индексе"""
+        entry = (normalize(title), normalize(author))
+        if self._entries.get(key) == entry:
+            return False
+
+        self.remove(key)
+        self._entries[key] = entry
+        for gram in self._grams_of(entry):
+            keys = self._grams.get(gram)
+            if keys is None:
+                self._grams[gram] = {key}
+            else:
+                keys.add(key)
+        return True
+
+    def remove(self, key):
+        """Удаление книги из индекса"""
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return False
+
+        for gram in self._grams_of(entry):
+            keys = self._grams.get(gram)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._grams[gram]
+        return True
+
+    def rebuild(self, books):
+        """Построение индекса заново по списку книг"""
+        self._entries = {}
+        self._grams = {}
+        for book in books:
+            self.add(book.path, book.title, book.author)
+
+    def search(self, query, limit=SEARCH_LIMIT):
+        """
+        Ключи книг, отсортированные по релевантности.
+
+        limit ограничивает выдачу самыми релевантными книгами: для коротких
+        запросов, под которые подходит почти вся библиотека, не приходится
+        сортировать все совпадения. None возвращает все совпадения.
+        """
+        query = normalize(query)
+        if not query:
+            return list(self._entries)
+
+        if len(query) < GRAM_SIZE:
+            # Короткий запрос: подстроку проверяет _rank у каждой книги
+            candidates = self._entries
+        else:
+            postings = []
+            for start in range(len(query) - GRAM_SIZE + 1):
+                keys = self._grams.get(query[start : start + GRAM_SIZE])
+                if not keys:
+                    return []
+                postings.append(keys)
+            postings.sort(key=len)
+            candidates = set(postings[0])
+            for keys in postings[1:]:
+                candidates &= keys
+                if not candidates:
+                    return []
+
+        ranked = []
+        for key in candidates:
+            title, author = self._entries[key]
+            rank = self._rank(query, title, author)
+            if rank is not None:
+                ranked.append((rank, title, key))
+
+        if limit is not None and len(ranked) > limit:
+            ranked = heapq.nsmallest(limit, ranked)
+        else:
+            ranked.sort()
+        return [key for _, _, key in ranked]
+
+    @staticmethod
+    def _rank(query, title, author):
+        """Чем меньше значение, тем выше книга в выдаче"""
+        for base, text in ((0, title), (3, author)):
+            position = text.find(query)
+            if position == 0:
+                return base
+            if position > 0:
+                if text[position - 1] == " ":
+                    return base + 1
+                return base + 2
+        return None
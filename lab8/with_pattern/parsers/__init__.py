@@ -1,5 +1,23 @@
+import sys
 from abc import ABCMeta, abstractmethod
 
+
+class BookElement:
+    """
+    Элемент текста книги: тип, HTML и длина текста.
+
+    В большой книге таких элементов десятки тысяч, поэтому вместо словаря
+    используется класс со __slots__, а имя типа интернируется.
+    """
+
+    __slots__ = ("type", "html", "text_len")
+
+    def __init__(self, element_type, html, text_len):
+        self.type = sys.intern(element_type)
+        self.html = html
+        self.text_len = text_len
+
+
 class BookIterator(metaclass=ABCMeta):
     """Абстрактный базовый класс для итераторов"""
 
@@ -14,7 +32,20 @@ class BookIterator(metaclass=ABCMeta):
     
 class AbstractFormatter(metaclass=ABCMeta):
     @abstractmethod
-    def parse(self, path):
+    def parse(self, path, lazy=False):
+        pass
+
+    @abstractmethod
+    def parse_metadata(self, path):
+        pass
+
+    @abstractmethod
+    def iter_elements(self, path):
+        pass
+
+    @abstractmethod
+    def load_cover(self, file_path, cover_id):
+        """Данные обложки по cover_id из parse_metadata или None"""
         pass
 
     @abstractmethod
@@ -0,0 +1,137 @@
+import base64
+import mmap
+import os
+import re
+from contextlib import contextmanager
+from xml.sax.saxutils import unescape
+
+BINARY_TAG = re.compile(rb"<(?:[\w.-]+:)?binary\b([^>]*)>")
+ATTRIBUTE = re.compile(rb"""([\w.:-]+)\s*=\s*(?:"([^"]*)"|'([^']*)')""")
+# Префикс пространства имён перед "binary" не длиннее этого
+TAG_LOOKBEHIND = 64
+# Порция чтения потока и запас под открывающий тег на границе порций
+STREAM_CHUNK_SIZE = 1 << 20
+MAX_TAG_LENGTH = 4096
+
+
+class BinarySection:
+    """Положение base64 содержимого одного блока <binary> в файле"""
+
+    __slots__ = ("id", "content_type", "start", "end")
+
+    def __init__(self, binary_id, content_type, start, end):
+        self.id = binary_id
+        self.content_type = content_type
+        self.start = start
+        self.end = end
+
+
+class BinaryIndex:
+    """
+    Индекс блоков <binary> FB2 файла по байтовым смещениям.
+
+    Файл просматривается как байты через mmap без XML разбора: находятся
+    открывающие теги <binary> и запоминаются границы их содержимого.
+    Изображения не попадают в дерево разбора и декодируются из
+    отображённого файла только при запросе через decode(). Для документа
+    из сжатого архива вместо пути передаются уже распакованные байты data.
+    """
+
+    def __init__(self, file_path, data=None):
+        self.file_path = file_path
+        self.sections = {}
+        self._data = data
+        self._scan()
+
+    @contextmanager
+    def _mapped(self):
+        if self._data is not None:
+            yield self._data
+        elif os.path.getsize(self.file_path) == 0:
+            # Пустой файл нельзя отобразить в память
+            yield b""
+        else:
+            with open(self.file_path, "rb") as f, mmap.mmap(
+                f.fileno(), 0, access=mmap.ACCESS_READ
+            ) as data:
+                yield data
+
+    def _scan(self):
+        with self._mapped() as data:
+            position = data.find(b"binary")
+            while position >= 0:
+                # Поиск подстроки быстрее регулярного выражения по всему файлу
+                tag_start = data.rfind(
+                    b"<", max(0, position - TAG_LOOKBEHIND), position
+                )
+                match = BINARY_TAG.match(data, tag_start) if tag_start >= 0 else None
+                if match is None or match.group(1).endswith(b"/"):
+                    position = data.find(b"binary", position + len(b"binary"))
+                    continue
+
+                start = match.end()
+                end = data.find(b"</", start)
+                if end < 0:
+                    end = len(data)
+                self._add_section(match.group(1), start, end)
+                position = data.find(b"binary", end)
+
+    def _add_section(self, attributes, start, end):
+        values = {}
+        for name, double_quoted, single_quoted in ATTRIBUTE.findall(attributes):
+            value = (double_quoted or single_quoted).decode("utf-8", "replace")
+            values[name.decode("ascii", "replace")] = unescape(value)
+
+        binary_id = values.get("id")
+        if binary_id and binary_id not in self.sections:
+            self.sections[binary_id] = BinarySection(
+                binary_id,
+                values.get("content-type", "application/octet-stream"),
+                start,
+                end,
+            )
+
+    @classmethod
+    def from_stream(cls, file_path, stream, binary_id):
+        """
+        Индекс с блоком binary_id из потока, например элемента zip архива.
+
+        Поток читается порциями и только до конца нужного блока. Прочитанный
+        текст книги не сохраняется: в памяти остаётся текущая порция и
+        начало незаконченного блока.
+        """
+        pending = b""
+        while True:
+            chunk = stream.read(STREAM_CHUNK_SIZE)
+            data = pending + chunk
+            index = cls(file_path, data)
+            section = index.sections.get(binary_id)
+            if not chunk or (section is not None and section.end < len(data)):
+                return index
+
+            if section is not None:
+                # Блок не закончился: порция дочитывается вместе с его тегом
+                pending = data[data.rfind(b"<", 0, section.start) :]
+            else:
+                pending = data[-MAX_TAG_LENGTH:]
+
+    def __contains__(self, binary_id):
+        return binary_id in self.sections
+
+    def decode(self, binary_id):
+        """Декодирование блока по id: {"data", "content_type"} или None"""
+        section = self.sections.get(binary_id)
+        if section is None:
+            return None
+
+        try:
+            with self._mapped() as data:
+                # b64decode отбрасывает переводы строк внутри блока
+                image_data = base64.b64decode(data[section.start : section.end])
+        except Exception as e:
+            print(f"Ошибка при декодировании блока {binary_id}: {e}")
+            return None
+
+        if not image_data:
+            return None
+        return {"data": image_data, "content_type": section.content_type}
@@ -0,0 +1,440 @@
+import mimetypes
+import posixpath
+import re
+import zipfile
+from html.entities import name2codepoint
+from urllib.parse import unquote
+
+from lxml import etree
+
+from utils import EPUB_NS, handle_errors
+from utils.profiler import PROFILER, ProfiledReader
+from parsers import AbstractFormatter, BookElement, BookIterator
+from parsers.fb2 import localname, render_element
+from parsers.pagination import PageProvider, iter_pages
+
+from PySide6.QtGui import QIcon, QPixmap
+
+
+RENDER_TAGS = {
+    "p": ("<p>", "</p>"),
+    "li": ("<p>", "</p>"),
+    "pre": ("<p>", "</p>"),
+    "h1": ("<h2>", "</h2>"),
+    "h2": ("<h2>", "</h2>"),
+    "h3": ("<h3>", "</h3>"),
+    "h4": ("<h3>", "</h3>"),
+    "h5": ("<h3>", "</h3>"),
+    "h6": ("<h3>", "</h3>"),
+    "em": ("<i>", "</i>"),
+    "i": ("<i>", "</i>"),
+    "strong": ("<b>", "</b>"),
+    "b": ("<b>", "</b>"),
+    "br": ("<br>", ""),
+}
+# Блочные теги XHTML и соответствующие им типы элементов книги
+BLOCK_TAGS = {
+    "p": "p",
+    "li": "p",
+    "pre": "p",
+    "h1": "title",
+    "h2": "title",
+    "h3": "subtitle",
+    "h4": "subtitle",
+    "h5": "subtitle",
+    "h6": "subtitle",
+}
+# Контейнеры блоков: их собственный текст вне блоков становится абзацем
+CONTAINER_TAGS = {
+    "body",
+    "div",
+    "section",
+    "article",
+    "aside",
+    "blockquote",
+    "header",
+    "footer",
+    "main",
+    "figure",
+    "figcaption",
+    "dd",
+    "dt",
+    "td",
+    "th",
+}
+# Служебные теги, текст которых в книгу не попадает
+SKIP_TAGS = {"head", "script", "style"}
+
+# Именованные сущности HTML вне XML: без DTD парсер их отбрасывает
+HTML_ENTITY = re.compile(rb"&([A-Za-z][A-Za-z0-9]{1,31});")
+XML_ENTITIES = {"amp", "lt", "gt", "quot", "apos"}
+MAX_ENTITY_LEN = 34
+
+
+def _numeric_entity(match):
+    name = match.group(1).decode("ascii")
+    if name in XML_ENTITIES or name not in name2codepoint:
+        return match.group(0)
+    return b"&#%d;" % name2codepoint[name]
+
+
+class HTMLEntityReader:
+    """
+    Файловый объект, заменяющий именованные сущности HTML числовыми.
+
+    XHTML документы EPUB часто используют &nbsp; и подобные сущности без
+    объявления DTD, и без замены слова вокруг них склеиваются.
+    """
+
+    def __init__(self, source):
+        self._source = source
+        self._rest = b""
+
+    def read(self, size=-1):
+        while True:
+            chunk = self._source.read(size)
+            data = self._rest + chunk
+            self._rest = b""
+            if not chunk or size is None or size < 0:
+                break
+            # Сущность на границе блока дочитывается следующим вызовом
+            amp = data.rfind(b"&", max(0, len(data) - MAX_ENTITY_LEN))
+            if amp != -1 and b";" not in data[amp:]:
+                data, self._rest = data[:amp], data[amp:]
+            if data:
+                break
+        return HTML_ENTITY.sub(_numeric_entity, data)
+
+
+class EPUBContentIterator(BookIterator):
+    """
+    Ленивый итератор по элементам текста EPUB книги.
+
+    Документы spine распаковываются из архива по одному, когда до них
+    доходит обход, и разбираются потоком через etree.iterparse. Каждый
+    блок верхнего уровня становится элементом книги, а текст контейнеров
+    вне блоков — абзацами в том же порядке, что и в документе.
+    """
+
+    def __init__(self, file_path, spine):
+        self._file_path = file_path
+        self._spine = spine
+        self._stream = self._iter_stream()
+
+    def _iter_stream(self):
+        with zipfile.ZipFile(self._file_path) as archive:
+            for name in self._spine:
+                try:
+                    source = archive.open(name)
+                except KeyError:
+                    print(f"Ошибка: в EPUB файле нет документа {name}")
+                    continue
+                with source:
+                    yield from self._iter_document(ProfiledReader(source))
+
+    def _iter_document(self, source):
+        context = etree.iterparse(
+            HTMLEntityReader(source),
+            events=("end",),
+            # События только для блоков и контейнеров в любом пространстве имён
+            tag=[f"{{*}}{tag}" for tag in (*BLOCK_TAGS, *CONTAINER_TAGS)],
+            recover=True,
+            huge_tree=True,
+        )
+        # Дочерний элемент каждого контейнера, текст перед которым уже выдан
+        flushed = {}
+        for _, element in context:
+            tag = localname(element.tag)
+            ancestors = list(element.iterancestors())
+            if any(localname(parent.tag) in BLOCK_TAGS for parent in ancestors):
+                # Вложенный блок войдёт в HTML внешнего
+                continue
+
+            # Текст контейнеров, стоящий перед элементом, идёт раньше него
+            pending = []
+            child = element
+            for ancestor in ancestors:
+                if flushed.get(ancestor) is child:
+                    # Выше по дереву с прошлого раза ничего не добавилось
+                    break
+                flushed[ancestor] = child
+                if not self._drop_blank(ancestor, child):
+                    pending.append((ancestor, child))
+                child = ancestor
+            for ancestor, child in reversed(pending):
+                book_element = self._loose_element(ancestor, child)
+                if book_element:
+                    yield book_element
+
+            if tag in BLOCK_TAGS:
+                with PROFILER.stage("render") as stage:
+                    # Хвост блока — текст контейнера, его заберёт _take_loose
+                    tail, element.tail = element.tail, None
+                    html_content, text_len = render_element(element, RENDER_TAGS)
+                    element.tail = tail
+                    stage.size = text_len
+                    book_element = BookElement(
+                        BLOCK_TAGS[tag], " ".join(html_content.split()), text_len
+                    )
+            else:
+                book_element = self._loose_element(element)
+            if book_element:
+                yield book_element
+            element.clear(keep_tail=True)
+        del context
+
+    @staticmethod
+    def _drop_blank(parent, before):
+        """
+        Быстрая проверка частого случая: перед before в контейнере только
+        предыдущий блок с пробельным хвостом. Такой блок удаляется.
+        """
+        if parent.text and not parent.text.isspace():
+            return False
+        previous = before.getprevious()
+        if previous is None:
+            parent.text = None
+            return True
+        if previous.getprevious() is not None or (
+            previous.tail and not previous.tail.isspace()
+        ):
+            return False
+        tag = localname(previous.tag)
+        if tag not in BLOCK_TAGS and tag not in CONTAINER_TAGS:
+            return False
+        parent.text = None
+        parent.remove(previous)
+        return True
+
+    def _loose_element(self, parent, before=None):
+        """Абзац из текста контейнера вне блоков или None, если текста нет"""
+        with PROFILER.stage("render") as stage:
+            html_content, text_len = self._take_loose(parent, before)
+            stage.size = text_len
+            html_content = " ".join(html_content.split())
+            if not html_content:
+                return None
+            return BookElement("p", f"<p>{html_content}</p>", text_len)
+
+    def _take_loose(self, parent, before=None):
+        """
+        HTML и длина текста контейнера до дочернего элемента before.
+
+        Разобранные дочерние элементы удаляются из дерева, поэтому каждый
+        кусок текста попадает в книгу один раз, а память не растёт.
+        """
+        parts = [parent.text or ""]
+        text_len = len(parts[0])
+        parent.text = None
+
+        children = []
+        for child in parent:
+            if child is before:
+                break
+            children.append(child)
+
+        for child in children:
+            tag = localname(child.tag)
+            tail = child.tail or ""
+            if tag in BLOCK_TAGS or tag in CONTAINER_TAGS or tag in SKIP_TAGS:
+                # Блоки уже выданы отдельными элементами: остаётся хвост
+                html_content, length = tail, len(tail)
+            elif any(
+                localname(node.tag) in BLOCK_TAGS or localname(node.tag) in CONTAINER_TAGS
+                for node in child.iterdescendants()
+            ):
+                # Строчный тег вокруг блоков: берётся только текст вне них
+                html_content, length = self._take_loose(child)
+                html_content += tail
+                length += len(tail)
+            else:
+                html_content, length = render_element(child, RENDER_TAGS)
+                length += len(tail)
+            parts.append(html_content)
+            text_len += length
+            parent.remove(child)
+
+        return "".join(parts), text_len
+
+    def __iter__(self):
+        """Возвращает себя как итератор"""
+        return self
+
+    def __next__(self):
+        return next(self._stream)
+
+    def reset(self):
+        self._stream = self._iter_stream()
+
+
+class EPUBFormatter(AbstractFormatter):
+    """Класс для парсинга EPUB файлов"""
+
+    def __init__(self):
+        self._namespaces = EPUB_NS
+
+    def parse(self, file_path, lazy=False):
+        """
+        Парсинг EPUB файла.
+
+        Из архива сразу читается только OPF пакет с метаданными и порядком
+        документов; сами документы распаковываются по мере чтения текста.
+        """
+        try:
+            package = self._read_package(file_path)
+            content_iterator = EPUBContentIterator(file_path, package["spine"])
+
+            if lazy:
+                content = PageProvider(content_iterator)
+                # Как и для FB2, первая страница готова сразу после открытия
+                content.get_page(0)
+                return {
+                    "metadata": package["metadata"],
+                    "content": content,
+                    "total_pages": content.total_pages,
+                    "cover": None,
+                    "cover_id": package["cover_id"],
+                }
+
+            content_pages = self._format_content_into_pages(content_iterator)
+            return {
+                "metadata": package["metadata"],
+                "content": content_pages,
+                "total_pages": len(content_pages),
+                "cover": self.load_cover(file_path, package["cover_id"]),
+            }
+        except Exception as e:
+            print(f"Ошибка при парсинге EPUB файла: {e}")
+            return {
+                "metadata": {"title": "Ошибка", "author": "Ошибка при загрузке файла"},
+                "content": ["<p>Ошибка: Не удалось обработать содержимое книги.</p>"],
+                "total_pages": 1,
+                "cover": None,
+            }
+
+    def parse_metadata(self, file_path):
+        """Чтение метаданных из OPF пакета без распаковки текста"""
+        try:
+            package = self._read_package(file_path)
+            return {"metadata": package["metadata"], "cover_id": package["cover_id"]}
+        except Exception as e:
+            print(f"Ошибка при чтении метаданных EPUB файла: {e}")
+            return {
+                "metadata": {
+                    "title": "Неизвестная книга",
+                    "author": "Неизвестный автор",
+                },
+                "cover_id": None,
+            }
+
+    def iter_elements(self, file_path):
+        """Потоковый обход элементов текста книги"""
+        return EPUBContentIterator(file_path, self._read_package(file_path)["spine"])
+
+    def load_cover(self, file_path, cover_id):
+        """Чтение обложки из архива; cover_id — путь изображения в архиве"""
+        if not cover_id:
+            return None
+
+        try:
+            with PROFILER.stage("cover") as stage:
+                with zipfile.ZipFile(file_path) as archive:
+                    image_data = archive.read(cover_id)
+                stage.size = len(image_data)
+        except Exception as e:
+            print(f"Ошибка при чтении обложки EPUB файла: {e}")
+            return None
+
+        content_type = mimetypes.guess_type(cover_id)[0]
+        return {
+            "data": image_data,
+            "content_type": content_type or "application/octet-stream",
+        }
+
+    def _read_package(self, file_path):
+        """Метаданные, порядок документов (spine) и обложка из OPF пакета"""
+        parser = etree.XMLParser(recover=True, remove_blank_text=True)
+        with zipfile.ZipFile(file_path) as archive:
+            container = etree.fromstring(
+                archive.read("META-INF/container.xml"), parser
+            )
+            opf_path = container.xpath(
+                "//container:rootfile/@full-path", namespaces=self._namespaces
+            )[0]
+            package = etree.fromstring(archive.read(opf_path), parser)
+
+        base_dir = posixpath.dirname(opf_path)
+        manifest = {}
+        for item in package.xpath(
+            "//opf:manifest/opf:item", namespaces=self._namespaces
+        ):
+            href = posixpath.normpath(
+                posixpath.join(base_dir, unquote(item.get("href", "")))
+            )
+            manifest[item.get("id")] = (href, item)
+
+        spine = [
+            manifest[idref][0]
+            for idref in package.xpath(
+                "//opf:spine/opf:itemref/@idref", namespaces=self._namespaces
+            )
+            if idref in manifest
+        ]
+
+        return {
+            "metadata": self._extract_metadata(package)
+            or {"title": "Неизвестная книга", "author": "Неизвестный автор"},
+            "spine": spine,
+            "cover_id": self._get_cover_id(package, manifest),
+        }
+
+    @handle_errors
+    def _extract_metadata(self, package):
+        """Извлечение метаданных из OPF пакета"""
+        metadata = {"title": "Неизвестная книга", "author": "Неизвестный автор"}
+
+        titles = package.xpath(
+            "//opf:metadata/dc:title/text()", namespaces=self._namespaces
+        )
+        if titles and titles[0].strip():
+            metadata["title"] = titles[0].strip()
+
+        authors = [
+            creator.strip()
+            for creator in package.xpath(
+                "//opf:metadata/dc:creator/text()", namespaces=self._namespaces
+            )
+            if creator.strip()
+        ]
+        if authors:
+            metadata["author"] = ", ".join(authors)
+
+        return metadata
+
+    def _get_cover_id(self, package, manifest):
+        """Путь изображения обложки в архиве (EPUB 3 или EPUB 2)"""
+        for href, item in manifest.values():
+            if "cover-image" in item.get("properties", "").split():
+                return href
+
+        cover_ref = package.xpath(
+            "//opf:metadata/opf:meta[@name='cover']/@content",
+            namespaces=self._namespaces,
+        )
+        if cover_ref and cover_ref[0] in manifest:
+            return manifest[cover_ref[0]][0]
+        return None
+
+    @handle_errors
+    def _format_content_into_pages(self, elements):
+        """Форматирование элементов контента в страницы"""
+        with PROFILER.stage("paginate"):
+            return list(iter_pages(elements)) or [PageProvider.EMPTY_PAGE]
+
+    def get_icon_from_cover(self, cover_data):
+        """Создание иконки из данных обложки"""
+        if cover_data and isinstance(cover_data.get("data"), bytes):
+            pixmap = QPixmap()
+            pixmap.loadFromData(cover_data["data"])
+            return QIcon(pixmap)
+        return None
@@ -1,207 +1,305 @@
+from itertools import islice
+
 from lxml import etree
-import base64
 
 from utils import FB2_NS, handle_errors
-from parsers import BookIterator, AbstractFormatter
+from utils.profiler import PROFILER, ProfiledReader
+from parsers import AbstractFormatter, BookElement, BookIterator
+from parsers.binary import BinaryIndex
+from parsers.pagination import PageProvider, iter_pages
 
 from PySide6.QtGui import QIcon, QPixmap
 
-CHARS_PER_PAGE = 1500
+
+RENDER_TAGS = {
+    "p": ("<p>", "</p>"),
+    "emphasis": ("<i>", "</i>"),
+    "strong": ("<b>", "</b>"),
+    "title": ("<h2>", "</h2>"),
+    "subtitle": ("<h3>", "</h3>"),
+    "empty-line": ("<br>", ""),
+}
+CONTENT_TAGS = {"p", "subtitle", "epigraph", "empty-line"}
+RENDER_BATCH = 64
+
+
+def open_binary(file_path):
+    """Открытие файла книги для чтения байтов"""
+    return open(file_path, "rb")
+
+
+def localname(tag):
+    """Имя тега без пространства имён; None для комментариев и инструкций"""
+    if not isinstance(tag, str):
+        return None
+    return tag.rpartition("}")[2]
+
+
+def render_element(element, render_tags=RENDER_TAGS):
+    """
+    HTML элемента и длина его текста без хвоста.
+
+    Обход идёт по явному стеку и складывает куски разметки в список,
+    поэтому время линейно по размеру поддерева при любой вложенности.
+    Пробелы не нормализуются: это делается один раз при создании BookElement.
+    Длина совпадает с etree.tostring(method="text", with_tail=False).
+    """
+    if element is None:
+        return "", 0
+
+    parts = []
+    text_len = 0
+    stack = []
+    node = element
+    while True:
+        if node is not None:
+            tag = localname(node.tag)
+            if tag is None:
+                # Комментарий: в текст попадает только хвост
+                stack.append((node, iter(()), ""))
+            else:
+                opening, closing = render_tags.get(tag, ("", ""))
+                text = node.text or ""
+                parts.append(opening)
+                parts.append(text)
+                text_len += len(text)
+                stack.append((node, iter(node), closing))
+
+        current, children, closing = stack[-1]
+        node = next(children, None)
+        if node is None:
+            stack.pop()
+            parts.append(closing)
+            tail = current.tail or ""
+            parts.append(tail)
+            if not stack:
+                break
+            text_len += len(tail)
+
+    return "".join(parts), text_len
 
 
 class FB2ContentIterator(BookIterator):
+    """
+    Ленивый итератор по элементам текста FB2 дерева.
+
+    Элементы строятся по одному при каждом вызове __next__, поэтому
+    потребитель может разбивать книгу на страницы, не дожидаясь разбора
+    всего текста и не храня все элементы разом.
+    """
+
     def __init__(self, root_element, namespaces):
         self._nodes = root_element.xpath("//fb:body", namespaces=namespaces)
         self._namespaces = namespaces
-        self._elements = []
-        self._position = 0
-
-        if self._nodes and len(self._nodes) > 0:
-            self._extract_elements(self._nodes[0])
+        self._stream = self._extract_elements(self._nodes[0] if self._nodes else None)
 
     def _extract_elements(self, start_node):
         """Извлекаем элементы из XML-дерева"""
         if start_node is None:
             return
 
-        sections = start_node.xpath("./fb:section", namespaces=self._namespaces)
+        sections = [
+            child for child in start_node if localname(child.tag) == "section"
+        ]
 
         if not sections:
-            self._process_node_content(start_node)
+            yield from self._rendered(self._process_node_content(start_node))
         else:
             for section in sections:
-                titles = section.xpath("./fb:title", namespaces=self._namespaces)
-                for title in titles:
-                    html_content = self._render_element(title)
-                    html_content = " ".join(html_content.split())
-                    text_len = len(
-                        etree.tostring(
-                            title, method="text", encoding="unicode", with_tail=False
-                        )
-                    )
-                    self._elements.append(
-                        {"type": "title", "html": html_content, "text_len": text_len}
-                    )
-
-                paragraphs = section.xpath(
-                    "./fb:p | ./fb:subtitle | ./fb:epigraph | ./fb:empty-line",
-                    namespaces=self._namespaces,
-                )
-                for p in paragraphs:
-                    tag = etree.QName(p.tag).localname
-                    html_content = self._render_element(p)
-                    html_content = " ".join(html_content.split())
-                    text_len = len(
-                        etree.tostring(
-                            p, method="text", encoding="unicode", with_tail=False
-                        )
-                    )
-                    self._elements.append(
-                        {"type": tag, "html": html_content, "text_len": text_len}
-                    )
-
-                self._process_nested_sections(section)
+                yield from self._rendered(self._process_section(section))
+
+    def _process_section(self, section):
+        """
+        Обработка секции за один проход по дочерним узлам.
+
+        Порядок вывода прежний: сначала заголовки, затем абзацы,
+        затем вложенные секции.
+        """
+        titles = []
+        paragraphs = []
+        nested_sections = []
+        for child in section:
+            tag = localname(child.tag)
+            if tag == "title":
+                titles.append(child)
+            elif tag in CONTENT_TAGS:
+                paragraphs.append(child)
+            elif tag == "section":
+                nested_sections.append(child)
+
+        for element in titles + paragraphs:
+            yield self._make_element(element)
 
-    def _process_nested_sections(self, section):
-        """Обработка вложенных секций"""
-        nested_sections = section.xpath("./fb:section", namespaces=self._namespaces)
         for nested_section in nested_sections:
-            titles = nested_section.xpath("./fb:title", namespaces=self._namespaces)
-            for title in titles:
-                html_content = self._render_element(title)
-                html_content = " ".join(html_content.split())
-                text_len = len(
-                    etree.tostring(
-                        title, method="text", encoding="unicode", with_tail=False
-                    )
-                )
-                self._elements.append(
-                    {"type": "title", "html": html_content, "text_len": text_len}
-                )
-
-            paragraphs = nested_section.xpath(
-                "./fb:p | ./fb:subtitle | ./fb:epigraph | ./fb:empty-line",
-                namespaces=self._namespaces,
-            )
-            for p in paragraphs:
-                tag = etree.QName(p.tag).localname
-                html_content = self._render_element(p)
-                html_content = " ".join(html_content.split())
-                text_len = len(
-                    etree.tostring(
-                        p, method="text", encoding="unicode", with_tail=False
-                    )
-                )
-                self._elements.append(
-                    {"type": tag, "html": html_content, "text_len": text_len}
-                )
-
-            self._process_nested_sections(nested_section)
+            yield from self._process_section(nested_section)
 
     def _process_node_content(self, node):
         """Обработка содержимого узла, если нет секций"""
-        elements = node.xpath(
-            "./fb:p | ./fb:title | ./fb:subtitle | ./fb:epigraph | ./fb:empty-line",
-            namespaces=self._namespaces,
+        for child in node:
+            tag = localname(child.tag)
+            if tag == "title" or tag in CONTENT_TAGS:
+                yield self._make_element(child)
+
+    def _make_element(self, element):
+        html_content, text_len = self._render_element(element)
+        return BookElement(
+            localname(element.tag), " ".join(html_content.split()), text_len
         )
-        for element in elements:
-            tag = etree.QName(element.tag).localname
-            html_content = self._render_element(element)
-            html_content = " ".join(html_content.split())
-            text_len = len(
-                etree.tostring(
-                    element, method="text", encoding="unicode", with_tail=False
-                )
-            )
-            self._elements.append(
-                {"type": tag, "html": html_content, "text_len": text_len}
-            )
 
-    def _render_element(self, element):
-        if element is None:
-            return ""
-
-        tag = etree.QName(element.tag).localname
-        text = element.text or ""
-        tail = element.tail or ""
-
-        content = ""
-
-        if tag == "p":
-            content = f"<p>{text}"
-            for child in element:
-                content += self._render_element(child)
-            content += "</p>"
-        elif tag == "emphasis":
-            content = f"<i>{text}"
-            for child in element:
-                content += self._render_element(child)
-            content += "</i>"
-        elif tag == "strong":
-            content = f"<b>{text}"
-            for child in element:
-                content += self._render_element(child)
-            content += "</b>"
-        elif tag == "title":
-            content = f"<h2>{text}"
-            for child in element:
-                content += self._render_element(child)
-            content += "</h2>"
-        elif tag == "subtitle":
-            content = f"<h3>{text}"
-            for child in element:
-                content += self._render_element(child)
-            content += "</h3>"
-        elif tag == "empty-line":
-            content = "<br>" + text
-            for child in element:
-                content += self._render_element(child)
-        else:
-            content = text
-            for child in element:
-                content += self._render_element(child)
+    @staticmethod
+    def _rendered(elements):
+        """Выдача элементов порциями; сборка порции замеряется как этап render"""
+        while True:
+            # Замер каждого элемента заметно замедлил бы разбор
+            with PROFILER.stage("render") as stage:
+                batch = list(islice(elements, RENDER_BATCH))
+                stage.size = sum(element.text_len for element in batch)
+            if not batch:
+                return
+            yield from batch
 
-        content += tail
-        return content.replace("\n", " ").strip()
+    def _render_element(self, element):
+        return render_element(element)
 
     def __iter__(self):
         """Возвращает себя как итератор"""
         return self
 
     def __next__(self):
-        if self._position >= len(self._elements):
-            raise StopIteration
+        return next(self._stream)
+
+    def reset(self):
+        body = self._nodes[0] if self._nodes else None
+        self._stream = self._extract_elements(body)
+
+
+class FB2StreamingContentIterator(FB2ContentIterator):
+    """
+    Потоковый итератор по элементам FB2 файла.
+
+    Файл читается через etree.iterparse: каждая секция первого <body>
+    превращается в элементы страницы сразу после закрывающего тега и
+    удаляется из дерева, поэтому в памяти никогда не хранится весь документ.
+    <description> передаётся в колбэк и тоже освобождается. На первом
+    <binary> разбор останавливается: блоки идут после всех <body>, а
+    изображения читаются отдельно через BinaryIndex.
+    """
+
+    def __init__(self, file_path, namespaces, on_description=None, opener=open_binary):
+        self._file_path = file_path
+        self._namespaces = namespaces
+        self._on_description = on_description
+        self._opener = opener
+        self._stream = self._iter_stream()
+
+    def _iter_stream(self):
+        # Файл закрывается, когда генератор завершён или удалён
+        with self._opener(self._file_path) as source:
+            yield from self._iter_source(ProfiledReader(source))
+
+    def _iter_source(self, source):
+        fb = "{%s}" % self._namespaces["fb"]
+        body_tag, section_tag = fb + "body", fb + "section"
+        binary_tag = fb + "binary"
+
+        context = etree.iterparse(
+            source,
+            events=("start", "end"),
+            recover=True,
+            remove_blank_text=True,
+            huge_tree=True,
+        )
 
-        element = self._elements[self._position]
-        self._position += 1
-        return element
+        body = None
+        bodies_seen = 0
+        has_sections = False
+
+        for event, element in context:
+            tag = element.tag
+
+            if event == "start":
+                if tag == body_tag:
+                    bodies_seen += 1
+                    body = element if bodies_seen == 1 else None
+                    has_sections = False
+                elif tag == binary_tag:
+                    break
+                continue
+
+            if tag == section_tag:
+                parent = element.getparent()
+                if parent is None or parent.tag != body_tag:
+                    # Вложенные секции обрабатываются вместе с родительской
+                    continue
+                if parent is body:
+                    has_sections = True
+                    yield from self._rendered(self._process_section(element))
+                self._release(element)
+            elif tag == body_tag:
+                if element is body and not has_sections:
+                    yield from self._rendered(self._process_node_content(element))
+                body = None
+                self._release(element)
+            elif tag == fb + "description":
+                if self._on_description:
+                    self._on_description(element)
+                self._release(element)
+
+        del context
+
+    @staticmethod
+    def _release(element):
+        """Освобождение уже обработанного поддерева"""
+        element.clear(keep_tail=True)
+        parent = element.getparent()
+        if parent is not None:
+            while element.getprevious() is not None:
+                del parent[0]
 
     def reset(self):
-        self._position = 0
+        """Повторное открытие файла и разбор с начала"""
+        # Закрытие генератора сразу освобождает прежний файл
+        self._stream.close()
+        self._stream = self._iter_stream()
 
 
 class FB2Formatter(AbstractFormatter):
     """Класс для парсинга FB2 файлов"""
 
-    def __init__(self):
+    def __init__(self, streaming=True):
         self._namespaces = FB2_NS
+        self._streaming = streaming
+
+    def parse(self, file_path, lazy=False):
+        """
+        Парсинг FB2 файла и извлечение данных.
+
+        При lazy=True содержимое возвращается как PageProvider, который
+        дочитывает файл только по мере перехода по страницам.
+        """
+        if self._streaming:
+            return self._parse_streaming(file_path, lazy)
 
-    def parse(self, file_path):
-        """Парсинг FB2 файла и извлечение данных"""
         try:
-            with open(file_path, "rb") as f:
+            with self._open(file_path) as f, PROFILER.stage("read") as stage:
                 fb2_content = f.read()
+                stage.size = len(fb2_content)
 
             parser = etree.XMLParser(recover=True, remove_blank_text=True)
-            root = etree.fromstring(fb2_content, parser=parser)
+            with PROFILER.stage("parse"):
+                root = etree.fromstring(fb2_content, parser=parser)
             content_iterator = FB2ContentIterator(root, self._namespaces)
             if root is None:
                 raise ValueError(f"Не удалось распарсить файл: {file_path}")
 
             metadata = self._extract_metadata(root)
-            content_pages = self._format_content_into_pages(content_iterator)
-            cover = self._extract_cover(root)
+            cover = self.load_cover(file_path, self._get_cover_id(root))
 
+            if lazy:
+                content = PageProvider(content_iterator)
+                return self._lazy_result(metadata, content, cover)
+
+            content_pages = self._format_content_into_pages(content_iterator)
             return {
                 "root": root,
                 "metadata": metadata,
@@ -211,12 +309,125 @@ class FB2Formatter(AbstractFormatter):
             }
         except Exception as e:
             print(f"Ошибка при парсинге FB2 файла: {e}")
+            return self._error_result()
+
+    def _parse_streaming(self, file_path, lazy=False):
+        """Потоковый парсинг FB2 файла без построения полного дерева"""
+        state = {"metadata": None, "cover_id": None}
+
+        def on_description(description):
+            state["metadata"] = self._extract_metadata(description)
+            state["cover_id"] = self._get_cover_id(description)
+
+        try:
+            content_iterator = FB2StreamingContentIterator(
+                file_path, self._namespaces, on_description, self._open
+            )
+
+            if lazy:
+                # Первая страница дочитывает поток до <body>, и к этому
+                # моменту <description> уже разобран
+                content = PageProvider(content_iterator)
+                content.get_page(0)
+                result = self._lazy_result(state["metadata"], content, None)
+                result["cover_id"] = state["cover_id"]
+                return result
+
+            content_pages = self._format_content_into_pages(content_iterator)
             return {
-                "metadata": {"title": "Ошибка", "author": "Ошибка при загрузке файла"},
-                "content": ["<p>Ошибка: Не удалось обработать содержимое книги.</p>"],
-                "total_pages": 1,
-                "cover": None,
+                "metadata": state["metadata"]
+                or {"title": "Неизвестная книга", "author": "Неизвестный автор"},
+                "content": content_pages,
+                "total_pages": len(content_pages),
+                "cover": self.load_cover(file_path, state["cover_id"]),
             }
+        except Exception as e:
+            print(f"Ошибка при парсинге FB2 файла: {e}")
+            return self._error_result()
+
+    def parse_metadata(self, file_path):
+        """
+        Чтение только метаданных книги.
+
+        Разбор останавливается сразу после </description>, поэтому время
+        не зависит от размера текста и вложенных изображений.
+        """
+        result = {
+            "metadata": {"title": "Неизвестная книга", "author": "Неизвестный автор"},
+            "cover_id": None,
+        }
+        try:
+            with self._open(file_path) as source:
+                context = etree.iterparse(
+                    source,
+                    events=("end",),
+                    tag="{%s}description" % self._namespaces["fb"],
+                    recover=True,
+                    huge_tree=True,
+                )
+                for _, description in context:
+                    result["metadata"] = (
+                        self._extract_metadata(description) or result["metadata"]
+                    )
+                    result["cover_id"] = self._get_cover_id(description)
+                    break
+                del context
+        except Exception as e:
+            print(f"Ошибка при чтении метаданных FB2 файла: {e}")
+        return result
+
+    @staticmethod
+    def _lazy_result(metadata, content, cover):
+        return {
+            "metadata": metadata
+            or {"title": "Неизвестная книга", "author": "Неизвестный автор"},
+            "content": content,
+            "total_pages": content.total_pages,
+            "cover": cover,
+        }
+
+    def iter_elements(self, file_path):
+        """Потоковый обход элементов текста книги"""
+        return FB2StreamingContentIterator(
+            file_path, self._namespaces, opener=self._open
+        )
+
+    def load_cover(self, file_path, cover_id):
+        """Декодирование обложки по смещению блока <binary> без разбора XML"""
+        if not cover_id:
+            return None
+
+        try:
+            with PROFILER.stage("cover") as stage:
+                cover = self._binary_index(file_path, cover_id).decode(cover_id)
+                stage.size = len(cover["data"]) if cover else 0
+            return cover
+        except Exception as e:
+            print(f"Ошибка при чтении обложки FB2 файла: {e}")
+            return None
+
+    def _open(self, file_path):
+        """Поток байтов FB2 документа; подклассы читают его из архива"""
+        return open_binary(file_path)
+
+    def _binary_index(self, file_path, binary_id):
+        """
+        Индекс блоков <binary> FB2 документа.
+
+        binary_id — нужный блок; файл на диске отображается в память
+        и один раз просматривается целиком в поисках тегов <binary>,
+        но дерево XML при этом не строится.
+        """
+        return BinaryIndex(file_path)
+
+    @staticmethod
+    def _error_result():
+        return {
+            "metadata": {"title": "Ошибка", "author": "Ошибка при загрузке файла"},
+            "content": ["<p>Ошибка: Не удалось обработать содержимое книги.</p>"],
+            "total_pages": 1,
+            "cover": None,
+        }
 
     @handle_errors
     def _extract_metadata(self, root):
@@ -266,63 +477,17 @@ class FB2Formatter(AbstractFormatter):
         if not elements:
             return ["<p>Не удалось извлечь содержимое книги (содержимое пусто).</p>"]
 
-        pages = []
-        current_page_html = []
-        current_page_chars = 0
-
-        for element in elements:
-            element_text_len = element["text_len"]
-            element_html = element["html"]
-
-            cost = element_text_len
-
-            if current_page_chars > 0 and (current_page_chars + cost > CHARS_PER_PAGE):
-                pages.append("".join(current_page_html))
-                current_page_html = [element_html]
-                current_page_chars = cost
-            elif cost > CHARS_PER_PAGE and not current_page_html:
-                pages.append(element_html)
-                current_page_html = []
-                current_page_chars = 0
-            else:
-                current_page_html.append(element_html)
-                current_page_chars += cost
-
-        if current_page_html:
-            pages.append("".join(current_page_html))
-
-        return pages if pages else ["<p>Содержимое не найдено.</p>"]
-
-    @handle_errors
-    def _extract_cover(self, root):
-        """Извлечение обложки книги"""
-        if root is None:
-            return None
+        with PROFILER.stage("paginate"):
+            return list(iter_pages(elements)) or [PageProvider.EMPTY_PAGE]
 
+    def _get_cover_id(self, root):
+        """Идентификатор бинарного блока с обложкой"""
         cover_href = root.xpath(
             "//fb:description/fb:title-info/fb:coverpage/fb:image/@l:href",
             namespaces=self._namespaces,
         )
-
         if cover_href:
-            cover_id = cover_href[0].lstrip("#")
-            binary_elements = root.xpath(
-                f"//fb:binary[@id='{cover_id}']", namespaces=self._namespaces
-            )
-
-            if binary_elements:
-                binary_element = binary_elements[0]
-                content_type = binary_element.get(
-                    "content-type", "application/octet-stream"
-                )
-                base64_data = binary_element.text
-
-                if base64_data:
-                    image_data = base64.b64decode(base64_data.strip())
-                    return {
-                        "data": image_data,
-                        "content_type": content_type,
-                    }
+            return cover_href[0].lstrip("#")
         return None
 
     def get_icon_from_cover(self, cover_data):
@@ -0,0 +1,40 @@
+import zipfile
+
+from parsers.binary import BinaryIndex
+from parsers.fb2 import FB2Formatter
+
+
+class ZippedFB2Formatter(FB2Formatter):
+    """
+    Разбор FB2 книг, упакованных в zip (.fb2.zip).
+
+    Документ распаковывается потоком прямо из архива по мере чтения,
+    без временных файлов на диске, и проходит тот же разбор, что и
+    обычный FB2 файл.
+    """
+
+    @staticmethod
+    def _find_entry(archive):
+        """Имя FB2 документа в архиве: первый .fb2 файл или первый файл"""
+        names = [info.filename for info in archive.infolist() if not info.is_dir()]
+        for name in names:
+            if name.lower().endswith(".fb2"):
+                return name
+        if names:
+            return names[0]
+        raise ValueError(f"Архив {archive.filename} не содержит книги")
+
+    def _open(self, file_path):
+        archive = zipfile.ZipFile(file_path)
+        try:
+            # Открытый элемент держит файл архива и после archive.close()
+            return archive.open(self._find_entry(archive))
+        finally:
+            archive.close()
+
+    def _binary_index(self, file_path, binary_id):
+        # Сжатые данные нельзя отобразить в память: документ распаковывается
+        # потоком и только до конца нужного блока
+        with zipfile.ZipFile(file_path) as archive:
+            with archive.open(self._find_entry(archive)) as source:
+                return BinaryIndex.from_stream(file_path, source, binary_id)
@@ -0,0 +1,227 @@
+import bisect
+import threading
+from collections import OrderedDict
+
+from utils.profiler import PROFILER
+
+CHARS_PER_PAGE = 1500
+
+NEW_PAGE, OWN_PAGE, SAME_PAGE = range(3)
+
+
+def place_element(page_chars, page_empty, cost, chars_per_page=CHARS_PER_PAGE):
+    """
+    Куда поставить очередной элемент относительно текущей страницы.
+
+    NEW_PAGE — элемент начинает новую страницу, OWN_PAGE — слишком длинный
+    элемент занимает отдельную страницу, SAME_PAGE — дописывается в текущую.
+    """
+    if page_chars > 0 and page_chars + cost > chars_per_page:
+        return NEW_PAGE
+    if cost > chars_per_page and page_empty:
+        return OWN_PAGE
+    return SAME_PAGE
+
+
+def iter_pages(elements, chars_per_page=CHARS_PER_PAGE):
+    """Постраничная выдача HTML по мере заполнения страниц"""
+    page = []
+    page_chars = 0
+    for element in elements:
+        cost = element.text_len
+        placement = place_element(page_chars, not page, cost, chars_per_page)
+        if placement == NEW_PAGE:
+            yield "".join(page)
+            page = [element.html]
+            page_chars = cost
+        elif placement == OWN_PAGE:
+            yield element.html
+        else:
+            page.append(element.html)
+            page_chars += cost
+    if page:
+        yield "".join(page)
+
+
+class PageProvider:
+    """
+    Ленивое разбиение потока элементов книги на страницы.
+
+    Элементы забираются из итератора только по мере необходимости:
+    чтобы показать страницу N, читается поток до страницы N + window.
+    HTML страниц собирается по запросу и хранится в небольшом LRU-кэше.
+    Методы потокобезопасны: поток можно дочитывать в фоне, пока
+    интерфейс запрашивает страницы.
+    """
+
+    EMPTY_PAGE = "<p>Содержимое не найдено.</p>"
+
+    def __init__(self, elements, chars_per_page=CHARS_PER_PAGE, window=2):
+        self._source = iter(elements)
+        self._chars_per_page = chars_per_page
+        self._window = window
+
+        self._elements = []
+        self._pages = []
+        self._page_start = 0
+        self._page_chars = 0
+        self._complete = False
+
+        self._rendered = OrderedDict()
+        self._rendered_limit = 2 * window + 1
+        self._lock = threading.RLock()
+
+    @classmethod
+    def from_pages(cls, pages):
+        """Провайдер поверх уже готового списка страниц"""
+        return cls.from_state(pages, [(i, i + 1) for i in range(len(pages))])
+
+    @classmethod
+    def from_state(cls, elements, pages):
+        """Восстановление полностью размеченной книги (например, из кэша)"""
+        provider = cls(())
+        provider._elements = list(elements)
+        provider._pages = [tuple(page) for page in pages]
+        provider._complete = True
+        return provider
+
+    def with_pages(self, pages):
+        """Другое разбиение тех же элементов, например по высоте вёрстки"""
+        with self._lock:
+            self.load_all()
+            provider = PageProvider(())
+            provider._elements = self._elements
+            provider._pages = [tuple(page) for page in pages]
+            provider._complete = True
+            return provider
+
+    def export_state(self):
+        """HTML элементов и границы страниц; доступно только после дочитки"""
+        with self._lock:
+            if not self._complete:
+                return None
+            return {"elements": list(self._elements), "pages": list(self._pages)}
+
+    @property
+    def total_pages(self):
+        """Количество уже известных страниц"""
+        return max(len(self._pages), 1) if self._complete else len(self._pages)
+
+    @property
+    def is_complete(self):
+        return self._complete
+
+    def has_page(self, page_num):
+        """Проверка существования страницы с дочиткой потока при необходимости"""
+        if page_num < 0:
+            return False
+        with self._lock:
+            self._ensure_pages(page_num + 1)
+            return page_num < self.total_pages
+
+    def get_page(self, page_num):
+        """HTML страницы; соседние страницы подготавливаются заранее"""
+        if page_num < 0:
+            return None
+
+        with self._lock:
+            self._ensure_pages(page_num + 1 + self._window)
+            if page_num >= self.total_pages:
+                return None
+
+            if page_num in self._rendered:
+                self._rendered.move_to_end(page_num)
+                return self._rendered[page_num]
+
+            html = self._render(page_num)
+            self._rendered[page_num] = html
+            if len(self._rendered) > self._rendered_limit:
+                self._rendered.popitem(last=False)
+            return html
+
+    def page_start(self, page_num):
+        """Индекс первого элемента страницы"""
+        with self._lock:
+            self._ensure_pages(page_num + 1)
+            if 0 <= page_num < len(self._pages):
+                return self._pages[page_num][0]
+            return 0
+
+    def find_page(self, element):
+        """Номер страницы, на которой находится элемент с указанным индексом"""
+        with self._lock:
+            # Дочитываем поток, пока страница с элементом не будет закрыта
+            with PROFILER.stage("parse"):
+                while self._page_start <= element and not self._complete:
+                    self._advance()
+            page = bisect.bisect_right(self._pages, element, key=lambda p: p[0]) - 1
+            return max(page, 0)
+
+    def load_more(self, count):
+        """Дочитать поток ещё на count страниц; возвращает число известных страниц"""
+        with self._lock:
+            self._ensure_pages(len(self._pages) + count)
+            return self.total_pages
+
+    def load_all(self):
+        """Дочитать поток до конца"""
+        with self._lock, PROFILER.stage("parse"):
+            while not self._complete:
+                self._advance()
+
+    def pages(self):
+        """Список HTML всех страниц книги"""
+        with self._lock:
+            self.load_all()
+            return [self._render(i) for i in range(self.total_pages)]
+
+    def _render(self, page_num):
+        if not self._pages:
+            return self.EMPTY_PAGE
+        start, end = self._pages[page_num]
+        return "".join(self._elements[start:end])
+
+    def _ensure_pages(self, count):
+        if len(self._pages) >= count or self._complete:
+            return
+        # Разбор файла и разметка страниц; чтение и сборка HTML элементов
+        # вычитаются как вложенные этапы
+        with PROFILER.stage("parse"):
+            while len(self._pages) < count and not self._complete:
+                self._advance()
+
+    def _advance(self):
+        """Забрать из потока один элемент и обновить границы страниц"""
+        try:
+            element = next(self._source)
+        except StopIteration:
+            self._finish()
+            return
+        except Exception as e:
+            print(f"Ошибка при чтении содержимого книги: {e}")
+            self._finish()
+            return
+
+        index = len(self._elements)
+        self._elements.append(element.html)
+        cost = element.text_len
+
+        placement = place_element(
+            self._page_chars, self._page_start == index, cost, self._chars_per_page
+        )
+        if placement == NEW_PAGE:
+            self._pages.append((self._page_start, index))
+            self._page_start = index
+            self._page_chars = cost
+        elif placement == OWN_PAGE:
+            self._pages.append((index, index + 1))
+            self._page_start = index + 1
+            self._page_chars = 0
+        else:
+            self._page_chars += cost
+
+    def _finish(self):
+        if self._page_start < len(self._elements):
+            self._pages.append((self._page_start, len(self._elements)))
+            self._page_start = len(self._elements)
+        self._complete = True
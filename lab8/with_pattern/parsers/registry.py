@@ -0,0 +1,34 @@
+import os
+from typing import Dict, Type
+
+from parsers import AbstractFormatter
+from parsers.epub import EPUBFormatter
+from parsers.fb2 import FB2Formatter
+from parsers.fb2zip import ZippedFB2Formatter
+
+FORMATTERS: Dict[str, Type[AbstractFormatter]] = {}
+
+
+def register_formatter(extension, formatter_class: Type[AbstractFormatter]):
+    """Регистрация формата книги; расширение может быть составным (.fb2.zip)"""
+    FORMATTERS[extension.lower()] = formatter_class
+
+
+def get_formatter_class(file_path) -> Type[AbstractFormatter]:
+    """Класс разбора по самому длинному подходящему расширению файла"""
+    file_name = os.path.basename(file_path).lower()
+    for extension in sorted(FORMATTERS, key=len, reverse=True):
+        if file_name.endswith(extension):
+            return FORMATTERS[extension]
+    return None
+
+
+def file_dialog_filter():
+    """Фильтр поддерживаемых форматов для диалога выбора файла"""
+    patterns = " ".join(f"*{extension}" for extension in FORMATTERS)
+    return f"Книги ({patterns});;Все файлы (*.*)"
+
+
+register_formatter(".fb2", FB2Formatter)
+register_formatter(".fb2.zip", ZippedFB2Formatter)
+register_formatter(".epub", EPUBFormatter)
@@ -0,0 +1,150 @@
+from PySide6.QtCore import (
+    QAbstractListModel,
+    QModelIndex,
+    QSortFilterProxyModel,
+    Qt,
+)
+from PySide6.QtGui import QIcon
+
+BookRole = Qt.UserRole + 1
+TitleRole = Qt.UserRole + 2
+AuthorRole = Qt.UserRole + 3
+DateAddedRole = Qt.UserRole + 4
+
+SORT_OPTIONS = {
+    "По названию (А-Я)": (TitleRole, Qt.AscendingOrder),
+    "По названию (Я-А)": (TitleRole, Qt.DescendingOrder),
+    "По автору (А-Я)": (AuthorRole, Qt.AscendingOrder),
+    "По автору (Я-А)": (AuthorRole, Qt.DescendingOrder),
+    "По дате добавления (сначала новые)": (DateAddedRole, Qt.DescendingOrder),
+    "По дате добавления (сначала старые)": (DateAddedRole, Qt.AscendingOrder),
+}
+
+
+class BookListModel(QAbstractListModel):
+    """
+    Модель списка книг поверх Library.books.
+
+    Строка модели совпадает с индексом книги в библиотеке. Иконки
+    запрашиваются у библиотеки только когда представление рисует строку.
+    """
+
+    def __init__(self, library, parent=None):
+        super().__init__(parent)
+        self._library = library
+        self._row_count = len(library.get_books())
+        self._default_icon = QIcon.fromTheme("document-new")
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return self._row_count
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or index.row() >= self._row_count:
+            return None
+
+        book = self._library.get_books()[index.row()]
+        if role == Qt.DisplayRole:
+            return f"{book.title}\n{book.author}"
+        if role == Qt.DecorationRole:
+            return self._library.get_icon(book) or self._default_icon
+        if role == BookRole:
+            return book
+        if role == TitleRole:
+            return book.title
+        if role == AuthorRole:
+            return book.author
+        if role == DateAddedRole:
+            return book.date_added
+        return None
+
+    def sync(self):
+        """Добавить в модель книги, появившиеся в библиотеке"""
+        count = len(self._library.get_books())
+        if count > self._row_count:
+            self.beginInsertRows(QModelIndex(), self._row_count, count - 1)
+            self._row_count = count
+            self.endInsertRows()
+        elif count < self._row_count:
+            self.reset()
+
+    def book_changed(self, row):
+        """Обновить отображение одной книги"""
+        index = self.index(row)
+        self.dataChanged.emit(index, index)
+
+    def reset(self):
+        """Полная перезагрузка модели"""
+        self.beginResetModel()
+        self._row_count = len(self._library.get_books())
+        self.endResetModel()
+
+
+class BookFilterProxyModel(QSortFilterProxyModel):
+    """
+    Фильтрация по результатам поиска и сортировка списка книг.
+
+    Пока активен поиск, книги идут в порядке релевантности, пока
+    пользователь явно не выберет другую сортировку.
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._matches = None
+        self._ranked = False
+        self._sort_option = None
+        self.setSortCaseSensitivity(Qt.CaseInsensitive)
+        self.setDynamicSortFilter(True)
+
+    def set_matches(self, books):
+        """Оставить в списке только указанные книги; None снимает фильтр"""
+        if books is None:
+            self._matches = None
+            self._ranked = False
+        else:
+            self._matches = {id(book): rank for rank, book in enumerate(books)}
+            self._ranked = True
+
+        # Сначала фильтр: сортировка по рангу видит только найденные книги
+        self.invalidate()
+        if self._ranked:
+            self.setSortRole(BookRole)
+            self.sort(0, Qt.AscendingOrder)
+        elif self._sort_option:
+            role, order = SORT_OPTIONS[self._sort_option]
+            self.setSortRole(role)
+            self.sort(0, order)
+        else:
+            self.sort(-1)
+
+    def set_sort_option(self, sort_option):
+        """Сортировка по одному из вариантов SortComboBox"""
+        if sort_option not in SORT_OPTIONS:
+            return
+        self._sort_option = sort_option
+        self._ranked = False
+        role, order = SORT_OPTIONS[sort_option]
+        self.setSortRole(role)
+        self.sort(0, order)
+        self.invalidate()
+
+    def _rank(self, index):
+        return self._matches.get(id(self.sourceModel().data(index, BookRole)))
+
+    def filterAcceptsRow(self, source_row, source_parent):
+        if self._matches is None:
+            return True
+        index = self.sourceModel().index(source_row, 0, source_parent)
+        return self._rank(index) is not None
+
+    def lessThan(self, left, right):
+        if self._ranked and self._matches is not None:
+            # Книги без ранга (не найденные) идут в конце
+            left_rank, right_rank = self._rank(left), self._rank(right)
+            if left_rank is None:
+                return False
+            if right_rank is None:
+                return True
+            return left_rank < right_rank
+        return super().lessThan(left, right)
@@ -0,0 +1,60 @@
+from PySide6.QtCore import QObject, Signal, Slot
+
+from .workers import ImportWorker, start_worker, stop_worker
+
+
+class BookImporter(QObject):
+    """
+    Массовый импорт книг в фоне.
+
+    Файлы разбирает ImportWorker в отдельном потоке, а этот объект живёт
+    в потоке интерфейса и пересылает его сигналы, поэтому к ним можно
+    подключать любые обработчики. Одновременно идёт не больше одного импорта.
+    """
+
+    progress = Signal(int, int)
+    bookImported = Signal()
+    finished = Signal(int)
+
+    def __init__(self, library, parent=None):
+        super().__init__(parent)
+        self.library = library
+        self._worker = None
+        self._thread = None
+        self._imported = 0
+
+    @property
+    def running(self):
+        return self._worker is not None
+
+    def start(self, paths):
+        """Запуск импорта; False, если предыдущий ещё не закончен"""
+        if self._worker is not None:
+            return False
+
+        worker = ImportWorker(self.library, paths)
+        worker.progress.connect(self.progress)
+        worker.bookImported.connect(self.bookImported)
+        worker.imported.connect(self._on_imported)
+        worker.finished.connect(self._on_finished)
+        self._worker = worker
+        self._imported = 0
+        self._thread = start_worker(worker, self)
+        return True
+
+    def stop(self):
+        """Прерывание импорта и ожидание завершения его потока"""
+        if self._worker is not None:
+            stop_worker(self._worker, self._thread)
+            self._worker = None
+            self._thread = None
+
+    @Slot(int)
+    def _on_imported(self, count):
+        self._imported = count
+
+    @Slot()
+    def _on_finished(self):
+        self._worker = None
+        self._thread = None
+        self.finished.emit(self._imported)
@@ -0,0 +1,69 @@
+from PySide6.QtGui import QFont, QTextDocument
+
+
+class LayoutPaginator:
+    """
+    Разбиение элементов книги на страницы по высоте вёрстки.
+
+    Каждый элемент верстается отдельно в QTextDocument с текущим шрифтом
+    и шириной области чтения. Qt не учитывает верхний отступ первого блока
+    и нижний отступ последнего, а между соседними блоками ставит больший
+    из двух отступов, поэтому высоту страницы можно сложить из замеров
+    отдельных элементов. Замеры зависят только от шрифта и ширины и
+    переиспользуются, когда меняется лишь высота окна.
+    """
+
+    def __init__(self, font, width, height):
+        self.font = QFont(font)
+        self.width = width
+        self.height = height
+
+    @property
+    def key(self):
+        """Ключ кэша границ страниц"""
+        return (self.font.key(), self.width, self.height)
+
+    @property
+    def measure_key(self):
+        """Ключ кэша замеров элементов"""
+        return (self.font.key(), self.width)
+
+    def measure(self, elements):
+        """Высота и внешние отступы каждого элемента: (height, top, bottom)"""
+        document = QTextDocument()
+        document.setDefaultFont(self.font)
+        document.setDocumentMargin(0)
+        document.setTextWidth(self.width)
+
+        for html in elements:
+            document.setHtml(html)
+            yield (
+                document.size().height(),
+                document.firstBlock().blockFormat().topMargin(),
+                document.lastBlock().blockFormat().bottomMargin(),
+            )
+
+    def paginate(self, metrics):
+        """Границы страниц (start, end) по замерам элементов"""
+        pages = []
+        start = 0
+        used = 0
+        prev_bottom = None
+
+        for index, (height, top, bottom) in enumerate(metrics):
+            if prev_bottom is None:
+                used = height
+            else:
+                extra = max(prev_bottom, top) + height
+                if used + extra > self.height:
+                    # Элемент выше страницы остаётся на отдельной странице
+                    pages.append((start, index))
+                    start = index
+                    used = height
+                else:
+                    used += extra
+            prev_bottom = bottom
+
+        if prev_bottom is not None:
+            pages.append((start, len(metrics)))
+        return pages
@@ -0,0 +1,115 @@
+import os
+
+from PySide6.QtCore import QFileSystemWatcher, QObject, QTimer, Signal, Slot
+
+from .workers import FolderSyncWorker, start_worker, stop_worker
+
+CHANGE_DELAY_MS = 1000
+POLL_INTERVAL_MS = 60_000
+
+
+class FolderWatcher(QObject):
+    """
+    Слежение за папками библиотеки.
+
+    Об изменениях в каталогах сообщает QFileSystemWatcher (inotify в Linux).
+    Для сетевых папок, откуда уведомления не приходят, папки дополнительно
+    опрашиваются раз в POLL_INTERVAL_MS. События копятся CHANGE_DELAY_MS,
+    затем FolderSyncWorker находит и разбирает изменившиеся файлы, а
+    библиотека обновляет только затронутые записи. Одновременно идёт
+    не больше одной проверки.
+    """
+
+    updated = Signal(dict)
+
+    def __init__(self, library, parent=None):
+        super().__init__(parent)
+        self.library = library
+        self._folders = []
+        self._worker = None
+        self._thread = None
+        self._pending = False
+
+        self._watcher = QFileSystemWatcher(self)
+        self._watcher.directoryChanged.connect(self._schedule)
+
+        self._delay_timer = QTimer(self)
+        self._delay_timer.setSingleShot(True)
+        self._delay_timer.setInterval(CHANGE_DELAY_MS)
+        self._delay_timer.timeout.connect(self.sync)
+
+        self._poll_timer = QTimer(self)
+        self._poll_timer.setInterval(POLL_INTERVAL_MS)
+        self._poll_timer.timeout.connect(self.sync)
+
+    def set_folders(self, folders):
+        """Смена списка отслеживаемых папок и немедленная проверка"""
+        self._folders = list(dict.fromkeys(os.path.abspath(f) for f in folders))
+        if self._folders:
+            self._poll_timer.start()
+        else:
+            self._poll_timer.stop()
+            self._delay_timer.stop()
+            self._watch_directories([])
+        self.sync()
+
+    def stop(self):
+        """Остановка таймеров и ожидание завершения текущей проверки"""
+        self._poll_timer.stop()
+        self._delay_timer.stop()
+        self._pending = False
+        if self._worker:
+            stop_worker(self._worker, self._thread)
+            self._worker = None
+            self._thread = None
+
+    @Slot(str)
+    def _schedule(self, _path=None):
+        self._delay_timer.start()
+
+    @Slot()
+    def sync(self):
+        """Проверка папок в фоне; повторный запрос ждёт окончания текущей"""
+        if not self._folders:
+            return
+        if self._worker is not None:
+            self._pending = True
+            return
+
+        worker = FolderSyncWorker(self.library, list(self._folders))
+        worker.changesReady.connect(self._apply)
+        worker.finished.connect(self._on_finished)
+        self._worker = worker
+        self._thread = start_worker(worker, self)
+
+    @Slot(object)
+    def _apply(self, result):
+        # Список папок мог смениться, пока шла проверка
+        prefixes = tuple(os.path.join(folder, "") for folder in self._folders)
+        self._watch_directories(
+            path
+            for path in result["directories"]
+            if path in self._folders or path.startswith(prefixes)
+        )
+        changes = result["changes"]
+        if changes["added"] or changes["changed"] or changes["removed"]:
+            summary = self.library.apply_folder_changes(changes, result["metadata"])
+            if any(summary.values()):
+                self.updated.emit(summary)
+
+    @Slot()
+    def _on_finished(self):
+        self._worker = None
+        self._thread = None
+        if self._pending:
+            self._pending = False
+            self._schedule()
+
+    def _watch_directories(self, directories):
+        """Подписка на каталоги: inotify не сообщает о вложенных папках"""
+        wanted = set(directories)
+        watched = set(self._watcher.directories())
+        if watched - wanted:
+            self._watcher.removePaths(list(watched - wanted))
+        if wanted - watched:
+            self._watcher.addPaths(list(wanted - watched))
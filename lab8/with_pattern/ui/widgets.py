@@ -1,4 +1,10 @@
 from PySide6.QtWidgets import (
+    QWidget,
+    QVBoxLayout,
+    QHBoxLayout,
+    QTreeWidget,
+    QTreeWidgetItem,
+    QListView,
     QListWidget,
     QListWidgetItem,
     QTextBrowser,
@@ -8,28 +14,28 @@ from PySide6.QtWidgets import (
     QLineEdit,
     QComboBox,
 )
-from PySide6.QtGui import QIcon, QFont
-from PySide6.QtCore import Qt, Signal
+from collections import OrderedDict
 
+from PySide6.QtGui import QFont, QTextDocument
+from PySide6.QtCore import QEvent, Qt, QTimer, Signal
 
-class BookListWidget(QListWidget):
-    """Виджет для отображения списка книг"""
+from utils.profiler import PROFILER
 
-    def __init__(self, parent=None):
-        super().__init__(parent)
+LAYOUT_CHANGE_DELAY_MS = 300
+PROFILE_REFRESH_MS = 1000
+PREFETCH_PAGES = 2
+PAGE_CACHE_SIZE = 2 * PREFETCH_PAGES + 3
 
-    def add_book_item(self, title, author, icon=None):
-        """Добавить элемент книги в список"""
-        item = QListWidgetItem(self)
-        item.setText(f"{title}\n{author}")
 
-        if icon:
-            item.setIcon(icon)
-        else:
-            # Использовать стандартную иконку, если обложка не найдена
-            item.setIcon(QIcon.fromTheme("document-new"))
+class BookListView(QListView):
+    """Представление списка книг поверх BookListModel"""
 
-        self.addItem(item)
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        # Одинаковая высота строк позволяет не измерять невидимые элементы
+        self.setUniformItemSizes(True)
+        self.setSelectionMode(QListView.SingleSelection)
+        self.setEditTriggers(QListView.NoEditTriggers)
 
 
 class BookmarkListWidget(QListWidget):
@@ -46,16 +52,129 @@ class BookmarkListWidget(QListWidget):
         self.addItem(item)
 
 
+class TextSearchResultsWidget(QListWidget):
+    """Виджет для отображения результатов поиска по тексту книг"""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setAlternatingRowColors(True)
+        self.setWordWrap(True)
+
+    def add_result_item(self, snippet, book_title, page_num):
+        """Добавить найденный фрагмент в список"""
+        item = QListWidgetItem(self)
+        item.setText(f"{snippet}\n{book_title} (стр. {page_num + 1})")
+        self.addItem(item)
+
+
 class ReadingTextBrowser(QTextBrowser):
-    """Виджет для отображения текста книги с возможностью выделения текста"""
+    """
+    Виджет для отображения текста книги с возможностью выделения текста.
+
+    Страницы с ключом хранятся как уже свёрстанные QTextDocument в
+    небольшом LRU-кэше: соседние страницы готовятся заранее в простое
+    цикла событий, и перелистывание сводится к замене документа.
+    """
 
     textSelected = Signal(str)
+    # Шрифт или размер области чтения изменились и устоялись
+    layoutChanged = Signal()
 
     def __init__(self, parent=None):
         super().__init__(parent)
         self.setReadOnly(True)
         self.setOpenLinks(False)
+
+        self._layout_timer = QTimer(self)
+        self._layout_timer.setSingleShot(True)
+        self._layout_timer.setInterval(LAYOUT_CHANGE_DELAY_MS)
+        self._layout_timer.timeout.connect(self.layoutChanged)
+
+        # Документы без родителя: setDocument удаляет прежний документ,
+        # если он дочерний для виджета, а кэшу нужно его сохранить
+        self._documents = OrderedDict()
+        self._current_document = None
+        self._prefetch_queue = []
+        self._prefetch_timer = QTimer(self)
+        self._prefetch_timer.setInterval(0)
+        self._prefetch_timer.timeout.connect(self._prefetch_next)
+
         self.setFont(QFont("Times New Roman", 12))
+        self.installEventFilter(self)
+
+    def show_page(self, html, key=None):
+        """Показ страницы; документ с ключом берётся из кэша или попадает в него"""
+        document = self._documents.get(key) if key is not None else None
+        if document is not None:
+            self._documents.move_to_end(key)
+        else:
+            document = self._create_document(html)
+            if key is not None:
+                self._store_document(key, document)
+
+        self._current_document = document
+        self.setDocument(document)
+
+    def prefetch(self, pages):
+        """Подготовка документов для пар (ключ, функция получения HTML)"""
+        self._prefetch_queue = [
+            (key, load) for key, load in pages if key not in self._documents
+        ]
+        if self._prefetch_queue:
+            self._prefetch_timer.start()
+
+    def clear_pages(self):
+        """Сброс подготовленных страниц, например после смены шрифта"""
+        self._documents.clear()
+        self._prefetch_queue = []
+        self._prefetch_timer.stop()
+
+    def _prefetch_next(self):
+        if not self._prefetch_queue:
+            self._prefetch_timer.stop()
+            return
+
+        key, load = self._prefetch_queue.pop(0)
+        try:
+            html = load()
+        except Exception as e:
+            print(f"Ошибка при подготовке страницы: {e}")
+            return
+        if html and key not in self._documents:
+            self._store_document(key, self._create_document(html))
+
+    def _create_document(self, html):
+        """Свёрстанный документ с текущим шрифтом и шириной области чтения"""
+        document = QTextDocument()
+        document.setDefaultFont(self.font())
+        document.setDocumentMargin(self.document().documentMargin())
+        with PROFILER.stage("set_html", len(html)):
+            document.setHtml(html)
+            document.setTextWidth(self.viewport().width())
+            document.size()
+        return document
+
+    def _store_document(self, key, document):
+        self._documents[key] = document
+        while len(self._documents) > PAGE_CACHE_SIZE:
+            self._documents.popitem(last=False)
+
+    def page_metrics(self):
+        """Шрифт, ширина и высота, доступные тексту одной страницы"""
+        margin = 2 * self.document().documentMargin()
+        width = self.viewport().width()
+        scroll_bar = self.verticalScrollBar()
+        if scroll_bar.isVisible():
+            # Ширина не должна зависеть от того, помещается ли текущая страница
+            width += scroll_bar.width()
+        return self.font(), int(width - margin), int(self.viewport().height() - margin)
+
+    def eventFilter(self, watched, event):
+        if watched is self and event.type() in (QEvent.Resize, QEvent.FontChange):
+            # Готовые документы свёрстаны под прежний шрифт и ширину
+            self.clear_pages()
+            self._layout_timer.start()
+        return super().eventFilter(watched, event)
 
     def selectionChanged(self):
         """Обработка изменения выделения текста"""
@@ -122,3 +241,89 @@ class PageInfoLabel(QLabel):
     def update_page_info(self, current, total):
         """Обновить информацию о текущей странице"""
         self.setText(f"Страница {current} из {total}")
+
+
+class ProfilerPanel(QWidget):
+    """
+    Панель замеров открытия книг и загрузки библиотеки.
+
+    Пока панель видна, она раз в PROFILE_REFRESH_MS запрашивает свежие
+    данные сигналом refreshRequested; новые сессии показываются сверху.
+    """
+
+    refreshRequested = Signal()
+    exportRequested = Signal()
+
+    SESSION_TITLES = {"open": "Открытие книги", "library": "Загрузка библиотеки"}
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        layout = QVBoxLayout(self)
+
+        self.tree = QTreeWidget()
+        self.tree.setHeaderLabels(["Этап", "Вызовы", "Время, мс", "Макс, мс", "Объём"])
+        self.tree.setColumnWidth(0, 220)
+        layout.addWidget(self.tree)
+
+        buttons_layout = QHBoxLayout()
+        self.refresh_button = QPushButton("Обновить")
+        self.refresh_button.clicked.connect(self.refreshRequested)
+        self.export_button = QPushButton("Экспорт JSON...")
+        self.export_button.clicked.connect(self.exportRequested)
+        buttons_layout.addWidget(self.refresh_button)
+        buttons_layout.addWidget(self.export_button)
+        layout.addLayout(buttons_layout)
+
+        self._sessions = None
+        self._refresh_timer = QTimer(self)
+        self._refresh_timer.setInterval(PROFILE_REFRESH_MS)
+        self._refresh_timer.timeout.connect(self.refreshRequested)
+
+    def set_sessions(self, sessions):
+        """Показ сессий из Profiler.sessions()"""
+        if sessions == self._sessions:
+            return
+        self._sessions = sessions
+
+        expanded = {
+            self.tree.topLevelItem(i).data(0, Qt.UserRole)
+            for i in range(self.tree.topLevelItemCount())
+            if self.tree.topLevelItem(i).isExpanded()
+        }
+        self.tree.clear()
+        for number, session in enumerate(reversed(sessions)):
+            key = (session["kind"], session["started"])
+            title = self.SESSION_TITLES.get(session["kind"], session["kind"])
+            item = QTreeWidgetItem(
+                [f"{title}: {session['name']}", "", f"{session['total_ms']:.1f}"]
+            )
+            item.setData(0, Qt.UserRole, key)
+            item.setToolTip(
+                0,
+                f"{session['started']}, до последнего замера "
+                f"{session['elapsed_ms']:.1f} мс",
+            )
+            for name, stage in session["stages"].items():
+                item.addChild(
+                    QTreeWidgetItem(
+                        [
+                            name,
+                            str(stage["calls"]),
+                            f"{stage['ms']:.1f}",
+                            f"{stage['max_ms']:.1f}",
+                            str(stage["size"] or ""),
+                        ]
+                    )
+                )
+            self.tree.addTopLevelItem(item)
+            # Последняя сессия раскрыта, остальные — как были
+            item.setExpanded(number == 0 or key in expanded)
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        self._refresh_timer.start()
+        self.refreshRequested.emit()
+
+    def hideEvent(self, event):
+        super().hideEvent(event)
+        self._refresh_timer.stop()
@@ -11,19 +11,25 @@ from PySide6.QtWidgets import (
     QStatusBar,
     QMessageBox,
     QFileDialog,
+    QProgressDialog,
+    QDockWidget,
 )
 from PySide6.QtGui import QAction
 from PySide6.QtCore import Qt, Slot
 
+from parsers.registry import file_dialog_filter
+from .book_model import BookFilterProxyModel
 from .widgets import (
-    BookListWidget,
+    BookListView,
     BookmarkListWidget,
+    TextSearchResultsWidget,
     ReadingTextBrowser,
     FontSizeSlider,
     NavigationButton,
     SearchInput,
     SortComboBox,
     PageInfoLabel,
+    ProfilerPanel,
 )
 from utils.helpers import ThemeManager
 
@@ -37,6 +43,7 @@ class MainWindow(QMainWindow):
         self.setWindowTitle("Электронная читалка")
         self.setMinimumSize(1000, 700)
 
+        self._create_profiler_dock()
         self._create_menu()
 
         # Создание центрального виджета
@@ -58,6 +65,15 @@ class MainWindow(QMainWindow):
         self.open_action.setShortcut("Ctrl+O")
         file_menu.addAction(self.open_action)
 
+        self.import_folder_action = QAction("Импортировать папку...", self)
+        file_menu.addAction(self.import_folder_action)
+
+        self.watch_folder_action = QAction("Следить за папкой...", self)
+        file_menu.addAction(self.watch_folder_action)
+
+        self.unwatch_folders_action = QAction("Перестать следить за папками", self)
+        file_menu.addAction(self.unwatch_folders_action)
+
         file_menu.addSeparator()
 
         self.exit_action = QAction("Выход", self)
@@ -85,6 +101,12 @@ class MainWindow(QMainWindow):
         self.dark_theme_action.setCheckable(True)
         theme_menu.addAction(self.dark_theme_action)
 
+        view_menu.addSeparator()
+
+        profiler_action = self.profiler_dock.toggleViewAction()
+        profiler_action.setText("Панель профилирования")
+        view_menu.addAction(profiler_action)
+
         # Меню "Закладки"
         bookmarks_menu = QMenu("Закладки", self)
         menu_bar.addMenu(bookmarks_menu)
@@ -124,7 +146,9 @@ class MainWindow(QMainWindow):
         library_layout.addLayout(search_layout)
 
         # Список книг
-        self.books_list = BookListWidget()
+        self.books_list = BookListView()
+        self.books_proxy = BookFilterProxyModel(self)
+        self.books_list.setModel(self.books_proxy)
         library_layout.addWidget(self.books_list)
 
         # Кнопка добавления книги
@@ -150,6 +174,22 @@ class MainWindow(QMainWindow):
 
         left_panel.addTab(bookmarks_tab, "Закладки")
 
+        # Вкладка "Поиск по тексту"
+        text_search_tab = QWidget()
+        text_search_layout = QVBoxLayout(text_search_tab)
+
+        self.text_search_input = SearchInput()
+        self.text_search_input.setPlaceholderText("Поиск по тексту книг...")
+        text_search_layout.addWidget(self.text_search_input)
+
+        self.text_search_results = TextSearchResultsWidget()
+        text_search_layout.addWidget(self.text_search_results)
+
+        self.goto_text_result_button = NavigationButton("Перейти")
+        text_search_layout.addWidget(self.goto_text_result_button)
+
+        left_panel.addTab(text_search_tab, "Поиск по тексту")
+
         # Правая панель: Чтение
         right_panel = QWidget()
         reading_layout = QVBoxLayout(right_panel)
@@ -191,19 +231,30 @@ class MainWindow(QMainWindow):
 
         main_layout.addWidget(splitter)
 
+    def _create_profiler_dock(self):
+        """Отладочная панель с замерами этапов, по умолчанию скрыта"""
+        self.profiler_panel = ProfilerPanel()
+        self.profiler_dock = QDockWidget("Профилирование", self)
+        self.profiler_dock.setObjectName("profiler_dock")
+        self.profiler_dock.setWidget(self.profiler_panel)
+        self.addDockWidget(Qt.BottomDockWidgetArea, self.profiler_dock)
+        self.profiler_dock.hide()
+
     @Slot()
     def _show_about(self):
         QMessageBox.about(self, "О программе", "<h3>Электронная читалка</h3>")
 
-    def populate_books_list(self, books):
-        """Заполнить список книг"""
-        self.books_list.clear()
+    def set_books_model(self, model):
+        """Подключить модель списка книг"""
+        self.books_proxy.setSourceModel(model)
 
-        for book in books:
-            title = book.get("title", "Неизвестная книга")
-            author = book.get("author", "Неизвестный автор")
-            icon = book.get("icon")
-            self.books_list.add_book_item(title, author, icon)
+    def filter_books(self, books):
+        """Показать только найденные книги; None показывает все"""
+        self.books_proxy.set_matches(books)
+
+    def sort_books(self, sort_option):
+        """Отсортировать список книг"""
+        self.books_proxy.set_sort_option(sort_option)
 
     def update_bookmarks_list(self, bookmarks):
         """Обновить список закладок"""
@@ -215,17 +266,41 @@ class MainWindow(QMainWindow):
             page = bookmark.get("page", 0)
             self.bookmarks_list.add_bookmark_item(text, book_title, page)
 
-    def set_current_book_content(self, content, current_page, total_pages):
+    def update_text_search_results(self, results):
+        """Обновить список результатов поиска по тексту"""
+        self.text_search_results.clear()
+
+        for result in results:
+            self.text_search_results.add_result_item(
+                result.get("snippet", ""), result["book"].title, result.get("page", 0)
+            )
+
+    def get_selected_text_result_index(self):
+        """Получить индекс выбранного результата поиска по тексту"""
+        selected_items = self.text_search_results.selectedItems()
+        if selected_items:
+            return self.text_search_results.row(selected_items[0])
+        return None
+
+    def set_current_book_content(
+        self, content, current_page, total_pages, page_key=None
+    ):
         """Установить содержимое текущей книги"""
         if content:
-            self.text_area.setHtml(content)
+            self.text_area.show_page(content, page_key)
             self.page_info_label.update_page_info(current_page, total_pages)
 
+    def clear_current_book_content(self):
+        """Очистить область чтения после закрытия книги"""
+        self.text_area.clear_pages()
+        self.text_area.clear()
+        self.page_info_label.update_page_info(0, 0)
+
     def get_selected_book_index(self):
-        """Получить индекс выбранной книги"""
-        selected_items = self.books_list.selectedItems()
-        if selected_items:
-            return self.books_list.row(selected_items[0])
+        """Получить индекс выбранной книги в библиотеке"""
+        selected = self.books_list.selectionModel().selectedIndexes()
+        if selected:
+            return self.books_proxy.mapToSource(selected[0]).row()
         return None
 
     def get_selected_bookmark_index(self):
@@ -242,10 +317,26 @@ class MainWindow(QMainWindow):
     def show_file_dialog(self):
         """Показать диалог выбора файла"""
         file_path, _ = QFileDialog.getOpenFileName(
-            self, "Открыть книгу", "", "FB2 файлы (*.fb2);;Все файлы (*.*)"
+            self, "Открыть книгу", "", file_dialog_filter()
         )
         return file_path
 
+    def show_folder_dialog(self, title="Импорт книг из папки"):
+        """Показать диалог выбора папки с книгами"""
+        return QFileDialog.getExistingDirectory(self, title)
+
+    def show_save_dialog(self, title, file_name, file_filter):
+        """Показать диалог выбора файла для сохранения"""
+        file_path, _ = QFileDialog.getSaveFileName(self, title, file_name, file_filter)
+        return file_path
+
+    def create_progress_dialog(self, title, total):
+        """Создать окно прогресса длительной операции"""
+        dialog = QProgressDialog(title, None, 0, total, self)
+        dialog.setWindowModality(Qt.WindowModal)
+        dialog.setMinimumDuration(0)
+        return dialog
+
     def apply_theme(self, theme_name):
         """Применить тему оформления"""
         ThemeManager.apply_theme(self, theme_name)
@@ -0,0 +1,298 @@
+import os
+
+import shiboken6
+from PySide6.QtCore import QObject, QThread, Signal, Slot
+
+from utils.profiler import PROFILER
+
+PAGES_PER_STEP = 20
+
+
+class BookLoader(QObject):
+    """
+    Фоновая загрузка книги.
+
+    Сначала отдаёт текущую страницу, затем дочитывает остальные страницы
+    порциями и сообщает о росте их количества. Сигналы нужно подключать
+    к слотам виджетов, чтобы они выполнялись в потоке интерфейса.
+    """
+
+    pageReady = Signal(str, int, int)
+    pagesCounted = Signal(int, int)
+    loaded = Signal(str)
+    finished = Signal()
+
+    def __init__(self, book):
+        super().__init__()
+        self.book = book
+        # Замеры относятся к сессии открытия, начатой до запуска потока
+        self._profile = PROFILER.current
+        self._cancelled = False
+
+    def cancel(self):
+        """Прервать загрузку: оставшиеся сигналы не отправляются"""
+        self._cancelled = True
+
+    @Slot()
+    def run(self):
+        with PROFILER.activate(self._profile):
+            self._load()
+
+    def _load(self):
+        try:
+            content = self.book.get_current_page_content()
+            if self._cancelled:
+                return
+            self.pageReady.emit(
+                content, self.book.current_page + 1, self.book.total_pages
+            )
+
+            pages = self.book.content
+            while not pages.is_complete and not self._cancelled:
+                pages.load_more(PAGES_PER_STEP)
+                self.pagesCounted.emit(
+                    self.book.current_page + 1, self.book.total_pages
+                )
+
+            if not self._cancelled:
+                self.book.update_cache()
+                self.pagesCounted.emit(
+                    self.book.current_page + 1, self.book.total_pages
+                )
+                self.loaded.emit(f"Книга загружена: {self.book.title}")
+        except Exception as e:
+            print(f"Ошибка при фоновой загрузке книги: {e}")
+        finally:
+            self.finished.emit()
+
+
+class PageLayoutWorker(QObject):
+    """
+    Фоновое разбиение книги на страницы по вёрстке.
+
+    Замеры элементов берутся из кэша книги, если шрифт и ширина не
+    менялись. Готовые границы страниц отправляются вместе с ключом
+    разбиения через layoutReady, а переключает на них книгу поток
+    интерфейса, который в это время читает её страницы.
+    """
+
+    layoutReady = Signal(object, object)
+    finished = Signal()
+
+    def __init__(self, book, paginator):
+        super().__init__()
+        self.book = book
+        self.paginator = paginator
+        self._profile = PROFILER.current
+        self._cancelled = False
+
+    def cancel(self):
+        """Прервать разбиение: книга остаётся на прежних страницах"""
+        self._cancelled = True
+
+    @Slot()
+    def run(self):
+        with PROFILER.activate(self._profile):
+            self._paginate()
+
+    def _paginate(self):
+        try:
+            content = self.book.content
+            while not content.is_complete and not self._cancelled:
+                content.load_more(PAGES_PER_STEP)
+            if self._cancelled:
+                return
+
+            measure_key = self.paginator.measure_key
+            metrics = self.book.get_layout_metrics(measure_key)
+            if metrics is None:
+                metrics = []
+                elements = content.export_state()["elements"]
+                with PROFILER.stage("layout_measure", len(elements)):
+                    for metric in self.paginator.measure(elements):
+                        if self._cancelled:
+                            return
+                        metrics.append(metric)
+                self.book.set_layout_metrics(measure_key, metrics)
+
+            with PROFILER.stage("layout_paginate", len(metrics)):
+                pages = self.paginator.paginate(metrics)
+            if not self._cancelled:
+                self.layoutReady.emit(self.paginator.key, pages)
+        except Exception as e:
+            print(f"Ошибка при разбиении книги на страницы: {e}")
+        finally:
+            self.finished.emit()
+
+
+class FullTextIndexer(QObject):
+    """Фоновое построение полнотекстового индекса для новых и изменённых книг"""
+
+    status = Signal(str)
+    finished = Signal()
+
+    def __init__(self, library):
+        super().__init__()
+        self.library = library
+        self.running = True
+        self._cancelled = False
+
+    def cancel(self):
+        """Остановить индексацию после текущей книги"""
+        self._cancelled = True
+
+    @Slot()
+    def run(self):
+        try:
+            indexed = 0
+            attempted = set()
+            # Повторная проверка подхватывает книги, добавленные во время работы
+            while not self._cancelled:
+                pending = [
+                    book
+                    for book in self.library.get_books_pending_fulltext()
+                    if book.path not in attempted
+                ]
+                if not pending:
+                    break
+                for book in pending:
+                    if self._cancelled:
+                        break
+                    attempted.add(book.path)
+                    self.status.emit(f"Индексация текста: {book.title}")
+                    self.library.index_book_text(book)
+                    indexed += 1
+
+            if indexed and not self._cancelled:
+                self.status.emit(f"Проиндексировано книг: {indexed}")
+        except Exception as e:
+            print(f"Ошибка при индексации текста: {e}")
+        finally:
+            self.running = False
+            self.finished.emit()
+
+
+class ImportWorker(QObject):
+    """
+    Фоновый массовый импорт книг.
+
+    Library.import_books разбирает файлы в пуле процессов и добавляет книги
+    из этого потока. Сигналы нужно подключать к слотам объектов потока
+    интерфейса.
+    """
+
+    progress = Signal(int, int)
+    bookImported = Signal()
+    imported = Signal(int)
+    finished = Signal()
+
+    def __init__(self, library, paths):
+        super().__init__()
+        self.library = library
+        self.paths = paths
+        self._cancelled = False
+
+    def cancel(self):
+        """Прервать импорт: уже добавленные книги сохраняются"""
+        self._cancelled = True
+
+    def _is_cancelled(self):
+        return self._cancelled
+
+    def _report_progress(self, done, total, book):
+        self.progress.emit(done, total)
+        if book is not None:
+            self.bookImported.emit()
+
+    @Slot()
+    def run(self):
+        try:
+            books = self.library.import_books(
+                self.paths, self._report_progress, is_cancelled=self._is_cancelled
+            )
+            self.imported.emit(len(books))
+        except Exception as e:
+            print(f"Ошибка при импорте книг: {e}")
+        finally:
+            self.finished.emit()
+
+
+class FolderSyncWorker(QObject):
+    """
+    Фоновая проверка отслеживаемых папок.
+
+    Сравнивает файлы папок с библиотекой по времени модификации и размеру
+    и разбирает новые и изменённые книги в пуле процессов. Записи
+    библиотеки обновляются в потоке интерфейса по сигналу changesReady,
+    поэтому сигнал нужно подключать к слоту объекта этого потока.
+    """
+
+    changesReady = Signal(object)
+    finished = Signal()
+
+    def __init__(self, library, folders):
+        super().__init__()
+        self.library = library
+        self.folders = folders
+        self._cancelled = False
+
+    def cancel(self):
+        """Прервать проверку: изменения не будут применены"""
+        self._cancelled = True
+
+    @Slot()
+    def run(self):
+        try:
+            changes = {"added": [], "changed": [], "removed": []}
+            directories = []
+            for folder in self.folders:
+                if self._cancelled:
+                    return
+                for key, paths in self.library.diff_folder(folder).items():
+                    changes[key].extend(paths)
+                # Вложенные каталоги для подписки на уведомления
+                directories.extend(path for path, _, _ in os.walk(folder))
+
+            metadata = {}
+            pending = list(dict.fromkeys(changes["added"] + changes["changed"]))
+            if pending:
+                for path, result in self.library.read_books_metadata(pending):
+                    if self._cancelled:
+                        return
+                    metadata[path] = result
+
+            if not self._cancelled:
+                self.changesReady.emit(
+                    {"changes": changes, "metadata": metadata, "directories": directories}
+                )
+        except Exception as e:
+            print(f"Ошибка при проверке папок: {e}")
+        finally:
+            self.finished.emit()
+
+
+def start_worker(worker, parent=None):
+    """Запуск объекта-воркера с методом run в отдельном QThread"""
+    thread = QThread(parent)
+    worker.moveToThread(thread)
+    thread.started.connect(worker.run)
+    worker.finished.connect(thread.quit)
+    worker.finished.connect(worker.deleteLater)
+    thread.finished.connect(thread.deleteLater)
+    thread.start()
+    return thread
+
+
+def stop_worker(worker, thread):
+    """
+    Отмена воркера и ожидание завершения его потока.
+
+    Нужна перед закрытием приложения: поток, который ещё работает
+    при удалении QThread, аварийно завершает процесс. Завершившийся
+    поток и воркер удаляются через deleteLater, такие пропускаются.
+    """
+    if shiboken6.isValid(worker):
+        worker.cancel()
+    if thread is not None and shiboken6.isValid(thread):
+        thread.quit()
+        thread.wait()
@@ -3,6 +3,12 @@ FB2_NS = {
     "l": "http://www.w3.org/1999/xlink",
 }
 
+EPUB_NS = {
+    "container": "urn:oasis:names:tc:opendocument:xmlns:container",
+    "opf": "http://www.idpf.org/2007/opf",
+    "dc": "http://purl.org/dc/elements/1.1/",
+}
+
 def handle_errors(func):
     def wrapper(*args, **kwargs):
         try:
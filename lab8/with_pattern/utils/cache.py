@@ -0,0 +1,184 @@
+import os
+import json
+import hashlib
+from collections import OrderedDict
+
+from PySide6.QtCore import QBuffer, QByteArray, QIODevice, Qt
+from PySide6.QtGui import QIcon, QImage, QPixmap
+
+from utils import handle_errors
+from utils.writer import write_json_atomic
+
+THUMBNAIL_SIZE = 128
+ICON_CACHE_SIZE = 512
+CACHE_VERSION = 2
+CONTENT_EXT = "content.json"
+
+
+def file_signature(book_path):
+    """Время модификации и размер файла книги"""
+    stat = os.stat(book_path)
+    return {"mtime": stat.st_mtime_ns, "size": stat.st_size}
+
+
+class BookCache:
+    """
+    Кэш разобранных книг в каталоге настроек.
+
+    Для каждой книги хранится небольшая запись с метаданными, которая
+    читается при запуске, и отдельный файл с HTML элементов и границами
+    страниц, который читается только при открытии книги. PNG-миниатюры
+    обложек лежат рядом и читаются через IconCache. Записи актуальны,
+    пока у файла книги не изменились время модификации и размер.
+    """
+
+    def __init__(self, settings_dir=".settings"):
+        self.cache_dir = os.path.join(settings_dir, "cache")
+
+        if not os.path.exists(self.cache_dir):
+            os.makedirs(self.cache_dir)
+
+    def _entry_path(self, book_path, ext):
+        key = hashlib.sha1(os.path.abspath(book_path).encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, f"{key}.{ext}")
+
+    def _read_entry(self, book_path, ext):
+        """JSON запись кэша, если файл книги не изменился"""
+        entry_file = self._entry_path(book_path, ext)
+        if not os.path.exists(entry_file):
+            return None
+
+        with open(entry_file, "r", encoding="utf-8") as f:
+            entry = json.load(f)
+
+        if entry.get("signature") != file_signature(book_path):
+            return None
+        return entry
+
+    @handle_errors
+    def load(self, book_path):
+        """Метаданные книги из кэша"""
+        entry = self._read_entry(book_path, "json")
+        if entry is None or entry.get("version") != CACHE_VERSION:
+            # Запись старого формата хранила текст книги внутри
+            return None
+        return entry
+
+    @handle_errors
+    def save(self, book):
+        """Сохранение метаданных книги"""
+        entry = book.to_cache_dict()
+        entry["version"] = CACHE_VERSION
+        entry["signature"] = file_signature(book.path)
+        # Запись через временный файл: читатель не увидит недописанный JSON
+        write_json_atomic(self._entry_path(book.path, "json"), entry)
+
+    @handle_errors
+    def load_content(self, book_path):
+        """HTML элементов и границы страниц: {"elements", "pages"} или None"""
+        return self._read_entry(book_path, CONTENT_EXT)
+
+    @handle_errors
+    def save_content(self, book_path, state):
+        """Сохранение состояния PageProvider.export_state() для книги"""
+        entry = {
+            "signature": file_signature(book_path),
+            "elements": state["elements"],
+            "pages": state["pages"],
+        }
+        write_json_atomic(self._entry_path(book_path, CONTENT_EXT), entry, indent=None)
+
+    @handle_errors
+    def load_thumbnail(self, book_path):
+        """PNG-миниатюра обложки, если она не старше файла книги"""
+        thumbnail_file = self._entry_path(book_path, "png")
+        if not os.path.exists(thumbnail_file):
+            return None
+        if os.path.getmtime(thumbnail_file) < os.path.getmtime(book_path):
+            return None
+
+        with open(thumbnail_file, "rb") as f:
+            return f.read()
+
+    @handle_errors
+    def save_thumbnail(self, book_path, cover):
+        """Сохранение миниатюры обложки; возвращает данные PNG"""
+        thumbnail = self._make_thumbnail(cover) if cover else None
+        thumbnail_file = self._entry_path(book_path, "png")
+        if thumbnail:
+            with open(thumbnail_file, "wb") as f:
+                f.write(thumbnail)
+        elif os.path.exists(thumbnail_file):
+            os.remove(thumbnail_file)
+        return thumbnail
+
+    @handle_errors
+    def remove(self, book_path):
+        """Удаление записи кэша книги"""
+        for ext in ("json", CONTENT_EXT, "png"):
+            entry_file = self._entry_path(book_path, ext)
+            if os.path.exists(entry_file):
+                os.remove(entry_file)
+
+    @staticmethod
+    def _make_thumbnail(cover):
+        """Уменьшенная копия обложки в формате PNG"""
+        image = QImage()
+        if not image.loadFromData(cover.get("data", b"")):
+            return None
+
+        image = image.scaled(
+            THUMBNAIL_SIZE, THUMBNAIL_SIZE, Qt.KeepAspectRatio, Qt.SmoothTransformation
+        )
+        data = QByteArray()
+        buffer = QBuffer(data)
+        buffer.open(QIODevice.WriteOnly)
+        image.save(buffer, "PNG")
+        return bytes(data)
+
+
+class IconCache:
+    """
+    LRU-кэш иконок обложек.
+
+    В памяти хранятся готовые QIcon из уменьшенных миниатюр, на диске —
+    PNG-миниатюры BookCache, поэтому полноразмерная обложка декодируется
+    только один раз за всё время жизни файла книги.
+    """
+
+    def __init__(self, book_cache: BookCache, capacity=ICON_CACHE_SIZE):
+        self._book_cache = book_cache
+        self._capacity = capacity
+        self._icons = OrderedDict()
+
+    def get(self, book):
+        """Иконка книги или None, если обложки нет"""
+        if book.path in self._icons:
+            self._icons.move_to_end(book.path)
+            return self._icons[book.path]
+
+        icon = self._load(book)
+        self._icons[book.path] = icon
+        if len(self._icons) > self._capacity:
+            self._icons.popitem(last=False)
+        return icon
+
+    def invalidate(self, book_path):
+        """Сброс иконки книги, например после изменения файла"""
+        self._icons.pop(book_path, None)
+
+    @handle_errors
+    def _load(self, book):
+        data = self._book_cache.load_thumbnail(book.path)
+        if data is None:
+            cover = book.get_cover_image()
+            if not cover:
+                return None
+            data = self._book_cache.save_thumbnail(book.path, cover)
+        if not data:
+            return None
+
+        pixmap = QPixmap()
+        if not pixmap.loadFromData(data):
+            return None
+        return QIcon(pixmap)
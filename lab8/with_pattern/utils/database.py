@@ -0,0 +1,302 @@
+import os
+import json
+import sqlite3
+import threading
+import time
+
+DB_NAME = "library.db"
+SCHEMA_VERSION = 3
+
+
+class Database:
+    """
+    Хранилище библиотеки, закладок, настроек и сессии в SQLite.
+
+    База работает в режиме WAL: фоновая запись сессии не блокирует
+    чтение. Каждое изменение — запись одной строки, а не перезапись
+    файла целиком. При первом открытии данные переносятся из прежних
+    JSON файлов каталога настроек, а базы прежних версий обновляются
+    шагами из MIGRATIONS.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS books (
+            position INTEGER PRIMARY KEY,
+            id TEXT NOT NULL,
+            path TEXT NOT NULL UNIQUE,
+            title TEXT NOT NULL,
+            author TEXT NOT NULL,
+            date_added TEXT NOT NULL,
+            current_page INTEGER NOT NULL DEFAULT 0,
+            element INTEGER,
+            char_offset INTEGER NOT NULL DEFAULT 0,
+            mtime INTEGER,
+            size INTEGER
+        );
+        CREATE INDEX IF NOT EXISTS books_id ON books (id);
+        CREATE TABLE IF NOT EXISTS bookmarks (
+            id INTEGER PRIMARY KEY,
+            book_id TEXT,
+            data TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS bookmarks_book_id ON bookmarks (book_id);
+        CREATE TABLE IF NOT EXISTS settings (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS sessions (
+            book_id TEXT PRIMARY KEY,
+            page INTEGER NOT NULL DEFAULT 0,
+            updated_at REAL NOT NULL,
+            element INTEGER,
+            char_offset INTEGER NOT NULL DEFAULT 0
+        );
+        CREATE INDEX IF NOT EXISTS sessions_updated_at ON sessions (updated_at);
+    """
+
+    # Обновление базы предыдущей версии до следующей
+    MIGRATIONS = {
+        # Позиция чтения: индекс элемента и смещение вместо номера страницы;
+        # в старых строках element остаётся NULL и читается page
+        2: (
+            "ALTER TABLE books ADD COLUMN element INTEGER",
+            "ALTER TABLE books ADD COLUMN char_offset INTEGER NOT NULL DEFAULT 0",
+            "ALTER TABLE sessions ADD COLUMN element INTEGER",
+            "ALTER TABLE sessions ADD COLUMN char_offset INTEGER NOT NULL DEFAULT 0",
+        ),
+        # Время модификации и размер файла при последнем разборе книги
+        3: (
+            "ALTER TABLE books ADD COLUMN mtime INTEGER",
+            "ALTER TABLE books ADD COLUMN size INTEGER",
+        ),
+    }
+
+    BOOK_COLUMNS = (
+        "id",
+        "path",
+        "title",
+        "author",
+        "date_added",
+        "current_page",
+        "element",
+        "char_offset",
+        "mtime",
+        "size",
+    )
+    BOOK_FIELDS = BOOK_COLUMNS[:7] + ("offset",) + BOOK_COLUMNS[8:]
+
+    def __init__(self, settings_dir=".settings"):
+        self.settings_dir = settings_dir
+        self.db_file = os.path.join(settings_dir, DB_NAME)
+
+        if not os.path.exists(settings_dir):
+            os.makedirs(settings_dir)
+
+        # Одно соединение на объект; сессию пишет фоновый поток DeferredWriter
+        self._lock = threading.RLock()
+        self._connection = sqlite3.connect(self.db_file, check_same_thread=False)
+
+        with self._lock:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("PRAGMA synchronous=NORMAL")
+            with self._connection:
+                self._connection.executescript(self.SCHEMA)
+            self._migrate()
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+    def _migrate(self):
+        """Перенос данных из JSON файлов или обновление схемы старой базы"""
+        version = self._connection.execute("PRAGMA user_version").fetchone()[0]
+        if version >= SCHEMA_VERSION:
+            return
+
+        with self._connection:
+            # BEGIN IMMEDIATE: второе соединение дождётся окончания переноса
+            self._connection.execute("BEGIN IMMEDIATE")
+            version = self._connection.execute("PRAGMA user_version").fetchone()[0]
+            if version >= SCHEMA_VERSION:
+                return
+            if version == 0:
+                # Новая база уже создана по последней схеме
+                JsonMigrator(self.settings_dir).migrate(self._connection)
+            else:
+                for step in range(version + 1, SCHEMA_VERSION + 1):
+                    for statement in self.MIGRATIONS[step]:
+                        self._connection.execute(statement)
+            self._connection.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    # Книги
+
+    def load_books(self):
+        """Книги в порядке добавления"""
+        with self._lock:
+            rows = self._connection.execute(
+                f"SELECT {', '.join(self.BOOK_COLUMNS)} FROM books ORDER BY position"
+            ).fetchall()
+        return [dict(zip(self.BOOK_FIELDS, row)) for row in rows]
+
+    def save_book(self, book_data):
+        """Добавление или обновление одной книги"""
+        self.save_books([book_data])
+
+    def save_books(self, books_data):
+        """Добавление или обновление книг одной транзакцией"""
+        with self._lock, self._connection:
+            self._connection.executemany(
+                f"INSERT INTO books ({', '.join(self.BOOK_COLUMNS)}) "
+                "VALUES (:id, :path, :title, :author, :date_added, "
+                ":current_page, :element, :offset, :mtime, :size) "
+                "ON CONFLICT (path) DO UPDATE SET id = excluded.id, "
+                "title = excluded.title, author = excluded.author, "
+                "date_added = excluded.date_added, "
+                "current_page = excluded.current_page, "
+                "element = excluded.element, char_offset = excluded.char_offset, "
+                "mtime = excluded.mtime, size = excluded.size",
+                books_data,
+            )
+
+    def remove_book(self, path):
+        self.remove_books([path])
+
+    def remove_books(self, paths):
+        """Удаление книг одной транзакцией"""
+        with self._lock, self._connection:
+            self._connection.executemany(
+                "DELETE FROM books WHERE path = ?", ((path,) for path in paths)
+            )
+
+    # Закладки
+
+    def load_bookmarks(self):
+        """Закладки в порядке добавления: список пар (id, данные)"""
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT id, data FROM bookmarks ORDER BY id"
+            ).fetchall()
+        return [(bookmark_id, json.loads(data)) for bookmark_id, data in rows]
+
+    def add_bookmark(self, bookmark_data):
+        """Добавление закладки; возвращает её id"""
+        with self._lock, self._connection:
+            return self._connection.execute(
+                "INSERT INTO bookmarks (book_id, data) VALUES (?, ?)",
+                (
+                    bookmark_data.get("book_id"),
+                    json.dumps(bookmark_data, ensure_ascii=False),
+                ),
+            ).lastrowid
+
+    def remove_bookmark(self, bookmark_id):
+        with self._lock, self._connection:
+            self._connection.execute(
+                "DELETE FROM bookmarks WHERE id = ?", (bookmark_id,)
+            )
+
+    # Настройки
+
+    def load_settings(self):
+        with self._lock:
+            rows = self._connection.execute("SELECT key, value FROM settings")
+            return {key: json.loads(value) for key, value in rows}
+
+    def set_setting(self, key, value):
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)",
+                (key, json.dumps(value, ensure_ascii=False)),
+            )
+
+    # Сессия
+
+    def load_session(self):
+        """Последняя открытая книга и позиция в ней"""
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT book_id, page, element, char_offset FROM sessions "
+                "ORDER BY updated_at DESC LIMIT 1"
+            ).fetchone()
+        if not row:
+            return {}
+        return dict(zip(("book_id", "page", "element", "offset"), row))
+
+    def save_session(self, session):
+        """Запоминание позиции в книге; пустая сессия забывает открытую книгу"""
+        with self._lock, self._connection:
+            if session.get("book_id"):
+                self._connection.execute(
+                    "INSERT OR REPLACE INTO sessions "
+                    "(book_id, page, updated_at, element, char_offset) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (
+                        session["book_id"],
+                        session.get("page", 0),
+                        time.time(),
+                        session.get("element"),
+                        session.get("offset", 0),
+                    ),
+                )
+            else:
+                self._connection.execute("DELETE FROM sessions")
+
+
+class JsonMigrator:
+    """Перенос library.json, bookmarks.json, settings.json и session.json"""
+
+    def __init__(self, settings_dir):
+        self.settings_dir = settings_dir
+
+    def _load(self, name):
+        path = os.path.join(self.settings_dir, name)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except Exception as e:
+            print(f"Ошибка при чтении {name} для переноса в базу: {e}")
+            return None
+
+    def migrate(self, connection):
+        """Запись данных JSON файлов в открытую транзакцию"""
+        library = self._load("library.json") or {}
+        for book in library.get("books", []):
+            if not book.get("path"):
+                continue
+            connection.execute(
+                "INSERT OR IGNORE INTO books "
+                "(id, path, title, author, date_added, current_page) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    book.get("id") or os.path.basename(book["path"]),
+                    book["path"],
+                    book.get("title", "Неизвестная книга"),
+                    book.get("author", "Неизвестный автор"),
+                    book.get("date_added", ""),
+                    book.get("current_page", 0),
+                ),
+            )
+
+        bookmarks = self._load("bookmarks.json") or {}
+        for bookmark in bookmarks.get("bookmarks", []):
+            connection.execute(
+                "INSERT INTO bookmarks (book_id, data) VALUES (?, ?)",
+                (bookmark.get("book_id"), json.dumps(bookmark, ensure_ascii=False)),
+            )
+
+        settings = self._load("settings.json") or {}
+        for key, value in settings.items():
+            connection.execute(
+                "INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)",
+                (key, json.dumps(value, ensure_ascii=False)),
+            )
+
+        session = self._load("session.json") or {}
+        if session.get("book_id"):
+            connection.execute(
+                "INSERT OR REPLACE INTO sessions (book_id, page, updated_at) "
+                "VALUES (?, ?, ?)",
+                (session["book_id"], session.get("page", 0), time.time()),
+            )
@@ -0,0 +1,203 @@
+import datetime
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from utils.writer import write_json_atomic
+
+PROFILE_HISTORY = 20
+
+
+class ProfileSession:
+    """
+    Замеры одной операции: открытия книги или загрузки библиотеки.
+
+    Повторные вызовы этапа (например, setHtml при каждом перелистывании)
+    не хранятся по отдельности, а суммируются: число вызовов, общее и
+    максимальное время, объём обработанных данных.
+    """
+
+    def __init__(self, kind, name):
+        self.kind = kind
+        self.name = name
+        self.started = time.time()
+        self._start = time.perf_counter()
+        self._last = self._start
+        self._stages = {}
+        self._lock = threading.Lock()
+
+    def add(self, stage, seconds, size=None):
+        """Учёт одного вызова этапа"""
+        with self._lock:
+            entry = self._stages.get(stage)
+            if entry is None:
+                entry = self._stages[stage] = {
+                    "calls": 0,
+                    "seconds": 0.0,
+                    "max": 0.0,
+                    "size": 0,
+                }
+            entry["calls"] += 1
+            entry["seconds"] += seconds
+            entry["max"] = max(entry["max"], seconds)
+            if size:
+                entry["size"] += size
+            self._last = time.perf_counter()
+
+    def to_dict(self):
+        with self._lock:
+            stages = {
+                name: {
+                    "calls": entry["calls"],
+                    "ms": round(entry["seconds"] * 1000, 3),
+                    "max_ms": round(entry["max"] * 1000, 3),
+                    "size": entry["size"],
+                }
+                for name, entry in self._stages.items()
+            }
+            elapsed = self._last - self._start
+        return {
+            "kind": self.kind,
+            "name": self.name,
+            "started": datetime.datetime.fromtimestamp(self.started).isoformat(),
+            # Сумма собственного времени этапов во всех потоках
+            "total_ms": round(sum(stage["ms"] for stage in stages.values()), 3),
+            # От начала операции до последнего замера
+            "elapsed_ms": round(elapsed * 1000, 3),
+            "stages": stages,
+        }
+
+
+class _Stage:
+    """Замер одного этапа; время вложенных этапов вычитается из него"""
+
+    __slots__ = ("name", "size", "_session", "_stack", "_start", "_nested")
+
+    def __init__(self, session, stack, name, size):
+        self.name = name
+        self.size = size
+        self._session = session
+        self._stack = stack
+        self._nested = 0.0
+
+    def __enter__(self):
+        self._stack.append(self)
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed = time.perf_counter() - self._start
+        self._stack.pop()
+        if self._stack:
+            self._stack[-1]._nested += elapsed
+        self._session.add(self.name, elapsed - self._nested, self.size)
+        return False
+
+
+class _NullStage:
+    """Этап вне сессии замеров: ничего не измеряет, size просто перезаписывается"""
+
+    __slots__ = ("size",)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+NULL_STAGE = _NullStage()
+
+
+class _ThreadState(threading.local):
+    """Активная сессия и стек открытых этапов потока"""
+
+    def __init__(self):
+        # Атрибуты есть у каждого потока: промах getattr по threading.local
+        # с исключением внутри в разы дороже обычного чтения
+        self.session = None
+        self.stack = []
+
+
+class Profiler:
+    """
+    Сбор длительности этапов открытия книг и загрузки библиотеки.
+
+    Замеры пишутся в сессию, активную в текущем потоке. start_session()
+    делает новую сессию активной для вызвавшего потока (потока интерфейса),
+    фоновые задачи подключаются к ней через activate(). В потоках без
+    активной сессии stage() возвращает пустой замер, поэтому фоновая
+    индексация не искажает данные, а цена вызова — одно чтение
+    threading.local. Время этапа собственное: вложенные этапы (чтение
+    файла внутри разбора) из него вычитаются.
+    """
+
+    def __init__(self, history=PROFILE_HISTORY):
+        self._sessions = deque(maxlen=history)
+        self._lock = threading.Lock()
+        self._local = _ThreadState()
+        self.current = None
+
+    def start_session(self, kind, name):
+        """Новая сессия замеров, активная в текущем потоке"""
+        session = ProfileSession(kind, name)
+        with self._lock:
+            self._sessions.append(session)
+        self.current = session
+        self._local.session = session
+        return session
+
+    @contextmanager
+    def activate(self, session=None):
+        """Запись замеров текущего потока в сессию (по умолчанию последнюю)"""
+        previous = self._local.session
+        self._local.session = session or self.current
+        try:
+            yield self._local.session
+        finally:
+            self._local.session = previous
+
+    def stage(self, name, size=None):
+        """Контекст замера этапа; объём можно указать и внутри через .size"""
+        local = self._local
+        if local.session is None:
+            return NULL_STAGE
+        return _Stage(local.session, local.stack, name, size)
+
+    def sessions(self):
+        """Сессии от старых к новым в виде словарей"""
+        with self._lock:
+            sessions = list(self._sessions)
+        return [session.to_dict() for session in sessions]
+
+    def export_json(self, path):
+        """Выгрузка всех сохранённых сессий в JSON файл"""
+        write_json_atomic(path, {"sessions": self.sessions()})
+
+
+PROFILER = Profiler()
+
+
+class ProfiledReader:
+    """Файловый объект, учитывающий чтение как этап "read" с объёмом в байтах"""
+
+    def __init__(self, source, profiler=PROFILER):
+        self._source = source
+        self._profiler = profiler
+
+    def read(self, size=-1):
+        with self._profiler.stage("read") as stage:
+            data = self._source.read(size)
+            stage.size = len(data)
+        return data
+
+    def close(self):
+        self._source.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
@@ -1,24 +1,23 @@
-import os
-import json
 from utils import handle_errors
+from utils.database import Database
+from utils.writer import DeferredWriter
 
 
 class Storage:
     """Класс для управления хранением данных: настройки, закладки, сессия"""
 
-    def __init__(self, settings_dir=".settings"):
-        self.settings_dir = settings_dir
-
-        if not os.path.exists(settings_dir):
-            os.makedirs(settings_dir)
+    DEFAULT_SETTINGS = {"font_size": 12, "theme": "light", "watched_folders": []}
 
-        self.settings_file = os.path.join(settings_dir, "settings.json")
-        self.bookmarks_file = os.path.join(settings_dir, "bookmarks.json")
-        self.session_file = os.path.join(settings_dir, "session.json")
+    def __init__(self, settings_dir=".settings", database=None):
+        self.settings_dir = settings_dir
+        self._db = database or Database(settings_dir)
 
-        self.settings = {"font_size": 12, "theme": "light"}
+        self.settings = dict(self.DEFAULT_SETTINGS)
         self.bookmarks = []
+        self._bookmark_ids = []
         self.session = {}
+        # Сессия меняется на каждом перелистывании и пишется отложенно
+        self._writer = DeferredWriter(lambda _, session: self._db.save_session(session))
 
         # Загружаем данные
         self._load_settings()
@@ -27,82 +26,96 @@ class Storage:
 
     @handle_errors
     def _load_settings(self):
-        """Загрузка настроек из файла"""
-        if os.path.exists(self.settings_file):
-            with open(self.settings_file, "r", encoding="utf-8") as f:
-                data = json.load(f)
-                self.settings = {
-                    "font_size": data.get("font_size", 12),
-                    "theme": data.get("theme", "light"),
-                }
+        """Загрузка настроек из базы"""
+        data = self._db.load_settings()
+        self.settings = {
+            key: data.get(key, default) for key, default in self.DEFAULT_SETTINGS.items()
+        }
 
     @handle_errors
     def save_settings(self):
-        """Сохранение настроек в файл"""
-        with open(self.settings_file, "w", encoding="utf-8") as f:
-            json.dump(self.settings, f, ensure_ascii=False, indent=2)
+        """Сохранение настроек в базу"""
+        for key, value in self.settings.items():
+            self._db.set_setting(key, value)
 
     @handle_errors
     def _load_bookmarks(self):
-        """Загрузка закладок из файла"""
-        if os.path.exists(self.bookmarks_file):
-            with open(self.bookmarks_file, "r", encoding="utf-8") as f:
-                data = json.load(f)
-                self.bookmarks = data.get("bookmarks", [])
-
-    @handle_errors
-    def save_bookmarks(self):
-        """Сохранение закладок в файл"""
-        data = {"bookmarks": self.bookmarks}
-        with open(self.bookmarks_file, "w", encoding="utf-8") as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
+        """Загрузка закладок из базы"""
+        rows = self._db.load_bookmarks()
+        self._bookmark_ids = [bookmark_id for bookmark_id, _ in rows]
+        self.bookmarks = [bookmark for _, bookmark in rows]
 
     @handle_errors
     def _load_session(self):
         """Загрузка данных последней сессии"""
-        if os.path.exists(self.session_file):
-            with open(self.session_file, "r", encoding="utf-8") as f:
-                self.session = json.load(f)
+        self.session = self._db.load_session()
 
     @handle_errors
-    def save_session(self, book_id=None, page=0):
-        """Сохранение данных текущей сессии"""
+    def save_session(self, book_id=None, position=None):
+        """
+        Сохранение данных текущей сессии; запись идёт в фоне.
+
+        position — запись позиции из Book.saved_position().
+        """
         if book_id:
-            self.session = {"book_id": book_id, "page": page}
+            self.session = {"book_id": book_id, **(position or {})}
         else:
             self.session = {}
 
-        with open(self.session_file, "w", encoding="utf-8") as f:
-            json.dump(self.session, f, ensure_ascii=False, indent=2)
+        self._writer.write("session", self.session)
+
+    def flush(self):
+        """Запись отложенных изменений в базу"""
+        self._writer.flush()
+
+    def close(self):
+        """Запись отложенных изменений и остановка фоновой записи"""
+        self._writer.close()
 
     def get_font_size(self) -> int:
         """Получение текущего размера шрифта"""
         return self.settings.get("font_size", 12)
 
+    @handle_errors
     def set_font_size(self, size):
         """Установка размера шрифта"""
         self.settings["font_size"] = size
-        self.save_settings()
+        self._db.set_setting("font_size", size)
 
     def get_theme(self) -> str:
         """Получение текущей темы оформления"""
         return self.settings.get("theme", "light")
 
+    @handle_errors
     def set_theme(self, theme):
         """Установка темы оформления"""
         self.settings["theme"] = theme
-        self.save_settings()
+        self._db.set_setting("theme", theme)
 
+    def get_watched_folders(self) -> list:
+        """Папки, за которыми следит библиотека"""
+        return list(self.settings.get("watched_folders", []))
+
+    @handle_errors
+    def set_watched_folders(self, folders):
+        """Установка списка отслеживаемых папок"""
+        self.settings["watched_folders"] = list(folders)
+        self._db.set_setting("watched_folders", self.settings["watched_folders"])
+
+    @handle_errors
     def add_bookmark(self, bookmark_data):
         """Добавление новой закладки"""
+        bookmark_id = self._db.add_bookmark(bookmark_data)
         self.bookmarks.append(bookmark_data)
-        self.save_bookmarks()
+        self._bookmark_ids.append(bookmark_id)
 
+    @handle_errors
     def remove_bookmark(self, index) -> bool:
         """Удаление закладки по индексу"""
         if 0 <= index < len(self.bookmarks):
+            self._db.remove_bookmark(self._bookmark_ids[index])
             del self.bookmarks[index]
-            self.save_bookmarks()
+            del self._bookmark_ids[index]
             return True
         return False
 
@@ -110,6 +123,6 @@ class Storage:
         """Получение всех закладок"""
         return self.bookmarks
 
-    def get_last_session(self) -> tuple[int]:
-        """Получение данных последней сессии"""
-        return self.session.get("book_id"), self.session.get("page", 0)
+    def get_last_session(self) -> tuple:
+        """Книга последней сессии и запись позиции для Book.restore_position"""
+        return self.session.get("book_id"), self.session
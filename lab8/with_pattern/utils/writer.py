@@ -0,0 +1,111 @@
+import os
+import json
+import tempfile
+import threading
+import time
+
+SAVE_DELAY = 0.5
+MAX_SAVE_DELAY = 2.0
+
+
+def write_json_atomic(path, data, indent=2):
+    """Запись JSON во временный файл с последующим переименованием"""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-", suffix=".json")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=indent)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+class DeferredWriter:
+    """
+    Отложенная запись в фоновом потоке.
+
+    Запросы на запись по одному ключу объединяются: функция write_func
+    получает только последнее состояние, не раньше чем через delay секунд
+    после последнего запроса и не позже чем через max_delay после первого.
+    flush() пишет накопленное сразу, close() дополнительно останавливает поток.
+    """
+
+    def __init__(self, write_func, delay=SAVE_DELAY, max_delay=MAX_SAVE_DELAY):
+        self._write_func = write_func
+        self._delay = delay
+        self._max_delay = max_delay
+        self._pending = {}
+        self._first_request = None
+        self._deadline = None
+        self._closed = False
+
+        self._condition = threading.Condition()
+        # Порядок записей одного файла: старое состояние не перепишет новое
+        self._write_lock = threading.Lock()
+        self._thread = threading.Thread(
+            target=self._run, name="DeferredWriter", daemon=True
+        )
+        self._thread.start()
+
+    def write(self, key, data):
+        """Запланировать запись data по ключу key"""
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("Запись после закрытия DeferredWriter")
+
+            now = time.monotonic()
+            if self._first_request is None:
+                self._first_request = now
+            self._pending[key] = data
+            self._deadline = min(
+                now + self._delay, self._first_request + self._max_delay
+            )
+            self._condition.notify()
+
+    def flush(self):
+        """Немедленная запись всех отложенных изменений"""
+        with self._write_lock:
+            self._write_batch(self._take_pending())
+
+    def close(self):
+        """Запись отложенных изменений и остановка фонового потока"""
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        self._thread.join()
+        self.flush()
+
+    def _take_pending(self):
+        with self._condition:
+            batch, self._pending = self._pending, {}
+            self._first_request = None
+            return batch
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._pending and not self._closed:
+                    self._condition.wait()
+                if self._closed:
+                    return
+
+                while self._pending and not self._closed:
+                    timeout = self._deadline - time.monotonic()
+                    if timeout <= 0:
+                        break
+                    self._condition.wait(timeout)
+                if self._closed:
+                    return
+
+            self.flush()
+
+    def _write_batch(self, batch):
+        for key, data in batch.items():
+            try:
+                self._write_func(key, data)
+            except Exception as e:
+                print(f"Ошибка при отложенной записи {key}: {e}")
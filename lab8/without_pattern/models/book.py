@@ -1,4 +1,5 @@
 import os
+import sys
 import datetime
 import base64
 from lxml import etree
@@ -9,6 +10,17 @@ from utils import FB2_NS, handle_errors
 CHARS_PER_PAGE = 1500
 
 
+class BookElement:
+    """Элемент текста книги; __slots__ и интернированный тип вместо словаря"""
+
+    __slots__ = ("type", "html", "text_len")
+
+    def __init__(self, element_type, html, text_len):
+        self.type = sys.intern(element_type)
+        self.html = html
+        self.text_len = text_len
+
+
 class Book:
     def __init__(self, path, book_id=None):
         self.path = path
@@ -123,9 +135,7 @@ class Book:
                             title, method="text", encoding="unicode", with_tail=False
                         )
                     )
-                    elements.append(
-                        {"type": "title", "html": html_content, "text_len": text_len}
-                    )
+                    elements.append(BookElement("title", html_content, text_len))
 
                 paragraphs = section.xpath(
                     "./fb:p | ./fb:subtitle | ./fb:epigraph | ./fb:empty-line",
@@ -140,9 +150,7 @@ class Book:
                             p, method="text", encoding="unicode", with_tail=False
                         )
                     )
-                    elements.append(
-                        {"type": tag, "html": html_content, "text_len": text_len}
-                    )
+                    elements.append(BookElement(tag, html_content, text_len))
 
                 self._process_nested_sections(section, elements)
 
@@ -159,9 +167,7 @@ class Book:
                         title, method="text", encoding="unicode", with_tail=False
                     )
                 )
-                elements.append(
-                    {"type": "title", "html": html_content, "text_len": text_len}
-                )
+                elements.append(BookElement("title", html_content, text_len))
 
             paragraphs = nested_section.xpath(
                 "./fb:p | ./fb:subtitle | ./fb:epigraph | ./fb:empty-line",
@@ -176,9 +182,7 @@ class Book:
                         p, method="text", encoding="unicode", with_tail=False
                     )
                 )
-                elements.append(
-                    {"type": tag, "html": html_content, "text_len": text_len}
-                )
+                elements.append(BookElement(tag, html_content, text_len))
 
             self._process_nested_sections(nested_section, elements)
 
@@ -197,7 +201,7 @@ class Book:
                     element, method="text", encoding="unicode", with_tail=False
                 )
             )
-            elements.append({"type": tag, "html": html_content, "text_len": text_len})
+            elements.append(BookElement(tag, html_content, text_len))
 
     def _render_element(self, element):
         """Преобразование XML элемента в HTML"""
@@ -258,8 +262,8 @@ class Book:
         current_page_chars = 0
 
         for element in elements:
-            element_text_len = element["text_len"]
-            element_html = element["html"]
+            element_text_len = element.text_len
+            element_html = element.html
 
             cost = element_text_len
 